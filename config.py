@@ -1,43 +1,369 @@
+"""
+Configuration for the base44 sync scripts.
+
+Settings are resolved once, on first access, from the environment and the
+.env file next to this module, then held in a frozen Settings snapshot.
+Only the standard library and psycopg2 are needed to load them.
+
+For immutable deployments, run `python config.py` at build time to write
+config_generated.py; when that module exists it is used instead of reading
+the environment or .env. The generated module holds every setting in
+plaintext, including DB_PASSWORD and BASE44_API_KEY, so treat it like .env:
+keep it out of version control and readable only by the service user.
+Config.refresh() always reads the environment and .env, ignoring it.
+"""
+
+import importlib
+import mmap
 import os
+import re
+import sys
+from dataclasses import dataclass, field
+from typing import Any
+from urllib.parse import urlsplit
+
+from psycopg2.extensions import make_dsn
+
+_ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+_GENERATED_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "config_generated.py"
+)
+
+
+# .env grammar, following python-dotenv so the sync scripts read the same
+# values as mcp_server.py and webapp_api.py, which still load it with dotenv
+_LEADING_SPACE = re.compile(r"\s*")
+_EXPORT = re.compile(r"(?:export[^\S\r\n]+)?")
+_QUOTED_KEY = re.compile(r"'([^']+)'")
+_KEY = re.compile(r"([^=\#\s]+)")
+_SPACE = re.compile(r"[^\S\r\n]*")
+_EQUALS = re.compile(r"=[^\S\r\n]*")
+_SINGLE_QUOTED = re.compile(r"'((?:\\.|[^'\\])*)'", re.DOTALL)
+_DOUBLE_QUOTED = re.compile(r'"((?:\\.|[^"\\])*)"', re.DOTALL)
+_UNQUOTED = re.compile(r"[^\r\n]*")
+_LINE_END = re.compile(r"(?:[^\S\r\n]*#[^\r\n]*)?[^\S\r\n]*(?:\r\n|\n|\r|$)")
+_REST_OF_LINE = re.compile(r"[^\r\n]*(?:\r|\n|\r\n)?")
+_SINGLE_ESCAPES = re.compile(r"\\([\\'])")
+_DOUBLE_ESCAPES = re.compile(r"\\([\\'\"abfnrtv])")
+_ESCAPED = {"a": "\a", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v"}
+_VARIABLE = re.compile(r"\$\{([^}:]*)(?::-([^}]*))?\}")
+
+
+class _EnvSyntaxError(Exception):
+    pass
+
+
+def _unescape(match: re.Match[str]) -> str:
+    return _ESCAPED.get(match[1], match[1])
+
+
+def _parse_env(text):
+    """Yield (key, value) pairs from .env text, as python-dotenv parses them
+
+    Quoted values may span lines and may be followed by a ` # comment`;
+    double-quoted values decode backslash escapes. A key without `=` yields
+    None, and lines that don't parse are skipped.
+    """
+    pos = 0
+
+    def read(regex):
+        nonlocal pos
+        match = regex.match(text, pos)
+        if match is None:
+            raise _EnvSyntaxError
+        pos = match.end()
+        return match
+
+    while True:
+        read(_LEADING_SPACE)
+        if pos >= len(text):
+            return
+        try:
+            read(_EXPORT)
+            if text.startswith("#", pos):
+                key = None
+            else:
+                key = read(_QUOTED_KEY if text.startswith("'", pos) else _KEY)[1]
+            read(_SPACE)
+            value = None
+            if text.startswith("=", pos):
+                spaced = len(read(_EQUALS)[0]) > 1
+                char = text[pos : pos + 1]
+                if spaced and char == "#":
+                    value = ""
+                elif char == "'":
+                    value = _SINGLE_ESCAPES.sub(_unescape, read(_SINGLE_QUOTED)[1])
+                elif char == '"':
+                    value = _DOUBLE_ESCAPES.sub(_unescape, read(_DOUBLE_QUOTED)[1])
+                elif char in ("", "\n", "\r"):
+                    value = ""
+                else:
+                    value = re.sub(r"\s+#.*", "", read(_UNQUOTED)[0]).rstrip()
+            read(_LINE_END)
+        except _EnvSyntaxError:
+            read(_REST_OF_LINE)
+            continue
+        if key is not None:
+            yield key, value
+
+
+def _expand(value, env):
+    """Substitute ${VAR} and ${VAR:-default} references from env"""
 
-from dotenv import load_dotenv
+    def resolve(match):
+        result = env.get(match[1], match[2] or "")
+        return result if result is not None else ""
 
-load_dotenv()
+    return _VARIABLE.sub(resolve, value)
 
 
-class Config:
+def _load_env_file(path=_ENV_FILE, override=False):
+    """Load a .env file into os.environ the way python-dotenv's load_dotenv does"""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = mm[:].decode("utf-8").removeprefix("\ufeff")
+    except FileNotFoundError:
+        return
+
+    values = {}
+    for key, value in _parse_env(text):
+        if value is not None:
+            # Later .env entries can refer to earlier ones; the process
+            # environment wins unless overriding
+            if override:
+                env = {**os.environ, **values}
+            else:
+                env = {**values, **os.environ}
+            value = _expand(value, env)
+        values[key] = value
+
+    for key, value in values.items():
+        if value is None or (key in os.environ and not override):
+            continue
+        os.environ[key] = value
+
+
+def _load_dotenv_once():
+    """Parse .env at most once per process, even across module reloads"""
+    global _DOTENV_LOADED
+    if globals().get("_DOTENV_LOADED"):
+        return
+    _load_env_file()
+    _DOTENV_LOADED = True
+
+
+class _LazyConfig(type):
+    """Resolve settings from the environment on first attribute access"""
+
+    def __getattr__(cls, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return getattr(cls._resolve(), name)
+        except AttributeError:
+            raise AttributeError(f"Config has no setting {name!r}") from None
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Immutable snapshot of the resolved configuration"""
+
     # base44 API settings
-    BASE44_API_KEY = os.getenv("BASE44_API_KEY")
-    BASE44_API_URL = os.getenv("BASE44_API_URL", "https://app.base44.com/api")
-    BASE44_APP_ID = os.getenv("BASE44_APP_ID")
+    BASE44_API_KEY: str | None = field(repr=False)
+    BASE44_API_URL: str
+    BASE44_APP_ID: str | None
 
     # PostgreSQL settings
-    DB_HOST = os.getenv("DB_HOST", "localhost")
-    DB_PORT = os.getenv("DB_PORT", "5432")
-    DB_NAME = os.getenv("DB_NAME", "choreography")
-    DB_USER = os.getenv("DB_USER")
-    DB_PASSWORD = os.getenv("DB_PASSWORD")
+    DB_HOST: str
+    DB_PORT: int | str
+    DB_NAME: str
+    DB_USER: str | None
+    DB_PASSWORD: str | None = field(repr=False)
+
+    # libpq connection string, built once per snapshot
+    _dsn: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        dsn = make_dsn(
+            host=self.DB_HOST,
+            port=self.DB_PORT,
+            dbname=self.DB_NAME,
+            user=self.DB_USER,
+            password=self.DB_PASSWORD,
+        )
+        object.__setattr__(self, "_dsn", dsn)
+
+
+def _parse_port(value):
+    """Convert DB_PORT to int, leaving bad values for validate() to report"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _is_port(value):
+    return isinstance(value, int) and 0 < value < 65536
+
+
+def _is_http_url(value):
+    parts = urlsplit(value or "")
+    return parts.scheme in ("http", "https") and bool(parts.netloc)
+
+
+# Settings read from the environment, mapped to their defaults
+_DEFAULTS: dict[str, Any] = {
+    "BASE44_API_KEY": None,
+    "BASE44_API_URL": "https://app.base44.com/api",
+    "BASE44_APP_ID": None,
+    "DB_HOST": "localhost",
+    "DB_PORT": 5432,
+    "DB_NAME": "choreography",
+    "DB_USER": None,
+    "DB_PASSWORD": None,
+}
+
+# Settings that must be non-empty for validate() to pass
+_REQUIRED = frozenset({"BASE44_API_KEY", "BASE44_APP_ID", "DB_USER", "DB_PASSWORD"})
+
+# Never interned: interned strings live for the life of the process
+_SECRETS = frozenset({"BASE44_API_KEY", "DB_PASSWORD"})
+
+# Format checks applied by Config.validate(): (setting, predicate, problem)
+_CHECKS = (
+    ("DB_PORT", _is_port, "must be an integer port number"),
+    ("BASE44_API_URL", _is_http_url, "must be an http(s) URL"),
+)
+
+
+def _read_environment():
+    """Resolve every setting from the environment and .env"""
+    _load_dotenv_once()
+    get = os.environ.get
+    values: dict[str, Any] = {
+        name: get(name, default) for name, default in _DEFAULTS.items()
+    }
+    for name, value in values.items():
+        if isinstance(value, str) and name not in _SECRETS:
+            values[name] = sys.intern(value)
+    values["DB_PORT"] = _parse_port(values["DB_PORT"])
+    return values
+
+
+def _read_generated():
+    """Return the baked settings, or None when config_generated.py is absent"""
+    try:
+        values = importlib.import_module("config_generated").VALUES
+    except ModuleNotFoundError:
+        return None
+
+    missing = sorted(_DEFAULTS.keys() - values.keys())
+    extra = sorted(values.keys() - _DEFAULTS.keys())
+    if missing or extra:
+        problems = []
+        if missing:
+            problems.append(f"missing {', '.join(missing)}")
+        if extra:
+            problems.append(f"unknown {', '.join(extra)}")
+        raise ValueError(
+            f"config_generated.py does not match config.py ({'; '.join(problems)}); "
+            "re-run `python config.py` to regenerate it"
+        )
+    return values
+
+
+def bake(path=_GENERATED_FILE):
+    """Write the current settings to a module that replaces .env at runtime
+
+    Secrets are written in plaintext; see the module docstring.
+    """
+    values = _read_environment()
+    lines = [
+        '"""Generated by `python config.py`. Do not edit or commit."""',
+        "",
+        "VALUES = {",
+    ]
+    lines.extend(f"    {name!r}: {value!r}," for name, value in values.items())
+    lines.append("}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+class Config(metaclass=_LazyConfig):
+    _settings: Settings | None = None
+    _validated = False
+
+    @classmethod
+    def _resolve(cls):
+        """Snapshot the settings the first time one is read"""
+        if cls._settings is not None:
+            return cls._settings
+
+        values = _read_generated()
+        if values is None:
+            values = _read_environment()
+        cls._settings = Settings(**values)
+        return cls._settings
+
+    @classmethod
+    def settings(cls):
+        """Return the frozen settings snapshot"""
+        return cls._resolve()
+
+    @classmethod
+    def refresh(cls):
+        """Reload .env and rebuild the snapshot from the environment
+
+        config_generated.py is skipped: refreshing means picking up the
+        current environment, which the baked values would otherwise shadow.
+        """
+        global _DOTENV_LOADED
+        _load_env_file(override=True)
+        _DOTENV_LOADED = True
+        cls._validated = False
+        cls._settings = Settings(**_read_environment())
 
     @classmethod
     def get_db_connection_string(cls):
-        return (
-            f"host={cls.DB_HOST} port={cls.DB_PORT} dbname={cls.DB_NAME} "
-            f"user={cls.DB_USER} password={cls.DB_PASSWORD}"
-        )
+        return cls._resolve()._dsn
 
     @classmethod
     def validate(cls):
-        """Validate that all required configuration is present"""
-        required = [
-            ("BASE44_API_KEY", cls.BASE44_API_KEY),
-            ("BASE44_APP_ID", cls.BASE44_APP_ID),
-            ("DB_USER", cls.DB_USER),
-            ("DB_PASSWORD", cls.DB_PASSWORD),
-        ]
+        """Validate that all required configuration is present and well-formed"""
+        if cls._validated:
+            return True
 
-        missing = [name for name, value in required if not value]
+        settings = cls._resolve()
+        present = {name for name in _REQUIRED if getattr(settings, name)}
+        missing = sorted(_REQUIRED - present)
+        invalid = [
+            f"{name} {problem}"
+            for name, check, problem in _CHECKS
+            if not check(getattr(settings, name))
+        ]
 
+        errors = []
         if missing:
-            raise ValueError(f"Missing required configuration: {', '.join(missing)}")
+            errors.append(f"Missing required configuration: {', '.join(missing)}")
+        if invalid:
+            errors.append(f"Invalid configuration: {'; '.join(invalid)}")
+        if errors:
+            raise ValueError(". ".join(errors))
 
+        cls._validated = True
         return True
+
+
+def __getattr__(name):
+    """Expose settings as module attributes, e.g. `from config import DB_HOST`"""
+    if name in _DEFAULTS:
+        return getattr(Config.settings(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    print(f"✓ Wrote {bake()}")
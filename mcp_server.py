@@ -7,13 +7,22 @@ for searching tracks, analyzing feedback, and building class playlists.
 """
 
 import argparse
+import asyncio
+import functools
+import hashlib
 import hmac
+import inspect
 import json
 import logging
 import os
+import re
 import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from decimal import Decimal
 from typing import Any
@@ -24,20 +33,135 @@ from dotenv import load_dotenv
 from mcp.server.auth.provider import AccessToken
 from mcp.server.auth.settings import AuthSettings
 from mcp.server.fastmcp import Context, FastMCP
-from psycopg2.extras import RealDictCursor
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2.extensions import connection as PGConnection
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Load .env from the same directory as this script
 load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
 
-# Log level from env (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-LOG_LEVEL = os.getenv("MCP_LOG_LEVEL", "INFO").upper()
-if LOG_LEVEL not in {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}:
-    LOG_LEVEL = "INFO"
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in {"1", "true", "yes"}
+
+
+@dataclass(frozen=True, slots=True)
+class ServerSettings:
+    """Server configuration, read from the environment once at import."""
+
+    # Log level (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+    log_level: str
+
+    # PostgreSQL
+    db_host: str
+    db_port: int
+    db_name: str
+    db_user: str | None
+    db_password: str | None = field(repr=False)
+    db_connect_timeout: int
+    db_statement_timeout: int
+    # Pool max size is max_connections * db_pool_fraction,
+    # clamped to [db_pool_min, db_pool_max]
+    db_pool_min: int
+    db_pool_max: int
+    db_pool_fraction: float
+
+    # MCP transport and output
+    mcp_transport: str
+    mcp_host: str
+    mcp_port: int
+    mcp_mount_path: str
+    mcp_sse_path: str
+    mcp_message_path: str
+    mcp_http_path: str
+    tool_cache_ttl: float
+    pretty_json: bool
+    explain_queries: bool
+
+    # Optional MCP HTTP auth
+    auth_bearer_token: str = field(repr=False)
+    auth_scopes: tuple[str, ...]
+    auth_issuer_url: str
+    auth_resource_url: str
+    auth_client_id: str
+
+    # base44 and OpenAI
+    base44_api_key: str = field(repr=False)
+    base44_api_url: str
+    base44_app_id: str
+    openai_api_key: str = field(repr=False)
+    openai_model: str
+    openai_timeout: int
+    openai_cache_ttl: float
+
+    @classmethod
+    def from_env(cls) -> "ServerSettings":
+        get = os.getenv
+        log_level = get("MCP_LOG_LEVEL", "INFO").upper()
+        if log_level not in {"DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"}:
+            log_level = "INFO"
+        db_pool_min = max(1, int(get("DB_POOL_MIN", "1")))
+        return cls(
+            log_level=log_level,
+            db_host=get("DB_HOST", "localhost"),
+            db_port=int(get("DB_PORT", "5432")),
+            db_name=get("DB_NAME", "choreography"),
+            db_user=get("DB_USER"),
+            db_password=get("DB_PASSWORD"),
+            db_connect_timeout=int(get("DB_CONNECT_TIMEOUT", "5")),
+            db_statement_timeout=max(0, int(get("DB_STATEMENT_TIMEOUT_MS", "5000"))),
+            db_pool_min=db_pool_min,
+            db_pool_max=max(db_pool_min, int(get("DB_POOL_MAX", "50"))),
+            db_pool_fraction=float(get("DB_POOL_FRACTION", "0.25")),
+            mcp_transport=get("MCP_TRANSPORT", "stdio"),
+            mcp_host=get("MCP_HOST", "127.0.0.1"),
+            mcp_port=int(get("MCP_PORT", "8000")),
+            mcp_mount_path=get("MCP_MOUNT_PATH", "/"),
+            mcp_sse_path=get("MCP_SSE_PATH", "/sse"),
+            mcp_message_path=get("MCP_MESSAGE_PATH", "/messages/"),
+            mcp_http_path=get("MCP_HTTP_PATH", "/mcp"),
+            tool_cache_ttl=float(get("MCP_TOOL_CACHE_TTL", "60")),
+            pretty_json=_env_flag("MCP_PRETTY_JSON"),
+            explain_queries=_env_flag("MCP_EXPLAIN"),
+            auth_bearer_token=get("MCP_AUTH_BEARER_TOKEN", "").strip(),
+            auth_scopes=tuple(
+                s.strip()
+                for s in get("MCP_AUTH_SCOPES", "mcp:access").split(",")
+                if s.strip()
+            ),
+            auth_issuer_url=get("MCP_AUTH_ISSUER_URL", "http://127.0.0.1:8000"),
+            auth_resource_url=get("MCP_AUTH_RESOURCE_URL", "http://127.0.0.1:8000"),
+            auth_client_id=get("MCP_AUTH_CLIENT_ID", "authorized-client"),
+            base44_api_key=get("BASE44_API_KEY", ""),
+            base44_api_url=get("BASE44_API_URL", "https://app.base44.com/api"),
+            base44_app_id=get("BASE44_APP_ID", ""),
+            openai_api_key=get("OPENAI_API_KEY", "").strip(),
+            openai_model=get("OPENAI_MODEL", "gpt-4o-mini"),
+            openai_timeout=int(get("OPENAI_TIMEOUT_SECONDS", "45")),
+            openai_cache_ttl=float(get("OPENAI_CACHE_TTL", "3600")),
+        )
+
+    def db_params(self) -> dict[str, Any]:
+        """Keyword arguments for psycopg2.connect()."""
+        return {
+            "host": self.db_host,
+            "port": self.db_port,
+            "database": self.db_name,
+            "user": self.db_user,
+            "password": self.db_password,
+            "connect_timeout": self.db_connect_timeout,
+            # Applied per session so a runaway query can't pin a pooled connection.
+            "options": f"-c statement_timeout={self.db_statement_timeout}",
+        }
+
+
+SETTINGS = ServerSettings.from_env()
 
 # Configure logging to stderr (stdout is reserved for STDIO transport)
 logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL, logging.INFO),
+    level=getattr(logging, SETTINGS.log_level, logging.INFO),
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     stream=sys.stderr,
 )
@@ -53,31 +177,306 @@ def serialize(obj):
     return obj
 
 
-def serialize_rows(rows):
-    """Serialize a list of RealDictRow results."""
-    return [{k: serialize(v) for k, v in row.items()} for row in rows]
+def to_json(obj) -> str:
+    """Encode a tool result as JSON.
+
+    Results are parsed by the client, so they go out compact unless
+    MCP_PRETTY_JSON=1 asks for indented output when debugging.
+    """
+    if SETTINGS.pretty_json:
+        return json.dumps(obj, indent=2, default=serialize)
+    return json.dumps(obj, separators=(",", ":"), default=serialize)
+
+
+# Postgres type OIDs whose values need converting for JSON output
+_JSON_CONVERTERS = {
+    1700: float,  # numeric
+    1082: date.isoformat,  # date
+    1114: datetime.isoformat,  # timestamp
+    1184: datetime.isoformat,  # timestamptz
+}
+
+
+def serialize_rows(rows, description=None):
+    """Serialize query results as a list of dicts.
+
+    Without a description, rows are RealDictRow results and every value goes
+    through serialize(). With the cursor's description, rows are plain tuples
+    zipped with the column names, and only the columns whose Postgres type
+    needs converting are touched.
+    """
+    if description is None:
+        return [{k: serialize(v) for k, v in row.items()} for row in rows]
+
+    names = [col.name for col in description]
+    converters = [
+        (i, _JSON_CONVERTERS[col.type_code])
+        for i, col in enumerate(description)
+        if col.type_code in _JSON_CONVERTERS
+    ]
+    if not converters:
+        return [dict(zip(names, row)) for row in rows]
+
+    serialized = []
+    for row in rows:
+        values = list(row)
+        for i, convert in converters:
+            if values[i] is not None:
+                values[i] = convert(values[i])
+        serialized.append(dict(zip(names, values)))
+    return serialized
+
+
+def derive_pool_size(db_config: dict[str, Any]) -> int:
+    """Size the pool from the server's max_connections setting."""
+    conn = psycopg2.connect(**db_config)
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT setting::int FROM pg_settings WHERE name = 'max_connections'"
+        )
+        max_connections = cur.fetchone()[0]
+        cur.close()
+    finally:
+        conn.close()
+    size = int(max_connections * SETTINGS.db_pool_fraction)
+    return max(SETTINGS.db_pool_min, min(size, SETTINGS.db_pool_max))
+
+
+def _schema_check(pool: ThreadedConnectionPool, sql: str) -> bool:
+    """Run a single-value catalog query and return its result as a bool."""
+    conn = pool.getconn()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql)
+        row = cur.fetchone()
+        exists = bool(row and row[0])
+        cur.close()
+        conn.rollback()
+    finally:
+        pool.putconn(conn)
+    return exists
+
+
+def has_feedback_summary(pool: ThreadedConnectionPool) -> bool:
+    """Check whether migrate_add_feedback_summary.sql has been applied.
+
+    Views created before the per-audience counts were added don't count.
+    """
+    return _schema_check(
+        pool,
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM pg_attribute
+            WHERE attrelid = to_regclass('track_feedback_summary')
+              AND attname = 'down_by_audience'
+              AND NOT attisdropped
+        )
+        """,
+    )
+
+
+def has_search_blob(pool: ThreadedConnectionPool) -> bool:
+    """Check whether migrate_add_search_blob.sql has been applied."""
+    return _schema_check(
+        pool,
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'tracks'
+              AND column_name = 'search_blob'
+        )
+        """,
+    )
+
+
+# Rating upserts conflict on this key; migrate_add_audience.sql creates the
+# matching unique index, idx_track_feedback_unique
+_FEEDBACK_CONFLICT_KEY = (
+    "track_title, rating, COALESCE(context, ''), COALESCE(audience, '')"
+)
+_FEEDBACK_UPSERT_MISSING = (
+    "Ratings can't be saved: track_feedback lacks idx_track_feedback_unique "
+    "(apply migrate_add_audience.sql)"
+)
+
+
+def has_feedback_upsert_index(pool: ThreadedConnectionPool) -> bool:
+    """Check that a unique index on track_feedback matches _FEEDBACK_CONFLICT_KEY.
+
+    Planning the upsert infers its arbiter index the same way running it
+    does, so EXPLAIN fails exactly when the rating tools' inserts would.
+    """
+    conn = pool.getconn()
+    try:
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                EXPLAIN INSERT INTO track_feedback (track_title, rating)
+                VALUES ('', 'up')
+                ON CONFLICT ({_FEEDBACK_CONFLICT_KEY}) DO NOTHING
+                """)
+            return True
+        except psycopg2.ProgrammingError:
+            return False
+        finally:
+            cur.close()
+            conn.rollback()
+    finally:
+        pool.putconn(conn)
+
+
+def refresh_feedback_summary(conn) -> None:
+    """Bring track_feedback_summary up to date after feedback is written."""
+    cur = conn.cursor()
+    try:
+        cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY track_feedback_summary")
+        conn.commit()
+    finally:
+        cur.close()
+
+
+class FeedbackSummaryRefresher:
+    """Refresh track_feedback_summary in the background, coalescing bursts.
+
+    Writers call request() after committing. At most one refresh runs and at
+    most one more waits behind it, so a burst of ratings costs two refreshes
+    instead of one each, and no rating waits on REFRESH in its request.
+    Cached tool results are dropped once each refresh attempt finishes, so
+    nothing read from the old view outlives it.
+    """
+
+    def __init__(self, pool: ThreadedConnectionPool, slots: threading.BoundedSemaphore):
+        self._pool = pool
+        self._slots = slots
+        self._lock = threading.Lock()
+        self._pending = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="feedback-summary"
+        )
+
+    def request(self) -> None:
+        with self._lock:
+            if self._pending:
+                return
+            self._pending = True
+        self._executor.submit(self._refresh)
+
+    def _refresh(self) -> None:
+        # Writes committed from here on queue the next refresh
+        with self._lock:
+            self._pending = False
+        self._slots.acquire()
+        try:
+            conn = self._pool.getconn()
+            try:
+                refresh_feedback_summary(conn)
+            except Exception as e:
+                conn.rollback()
+                logger.warning(
+                    "Failed to refresh track_feedback_summary; feedback rankings "
+                    f"lag behind track_feedback until the next successful refresh: {e}"
+                )
+            finally:
+                self._pool.putconn(conn)
+        except Exception as e:
+            logger.warning(f"No connection to refresh track_feedback_summary: {e}")
+        finally:
+            self._slots.release()
+            _TOOL_CACHE.clear()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+class Base44SyncQueue:
+    """Sync feedback to base44 from a small worker pool, off the request path.
+
+    At most `limit` syncs are queued or running; past that submit() drops the
+    sync, so a base44 outage can't grow the backlog unbounded. close() cancels
+    syncs that haven't started, so shutdown waits on at most the running ones.
+    """
+
+    def __init__(self, limit: int = 200):
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._pending: set[Future] = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="base44-sync"
+        )
+
+    def submit(self, url: str, api_key: str, payload: dict[str, Any]) -> bool:
+        """Schedule a background sync; returns False if the backlog is full."""
+        if not self._slots.acquire(blocking=False):
+            logger.warning(
+                f"base44 sync backlog full; dropping sync for {payload['track_title']!r}"
+            )
+            return False
+        future = self._executor.submit(sync_feedback_to_base44, url, api_key, payload)
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return True
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def close(self) -> None:
+        with self._lock:
+            pending = list(self._pending)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        dropped = sum(future.cancelled() for future in pending)
+        if dropped:
+            logger.warning(f"Dropped {dropped} pending base44 sync(s) on shutdown.")
+
+
+class PreparingConnection(PGConnection):
+    """Pooled connection that remembers which statements it has PREPAREd."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
 
 
 @dataclass
 class AppContext:
-    db_pool: SimpleConnectionPool
+    db_pool: ThreadedConnectionPool
+    db_slots: threading.BoundedSemaphore
     base44_api_key: str
     base44_api_url: str
     base44_app_id: str
+    base44_sync: Base44SyncQueue
+    # Read per-track feedback counts from the track_feedback_summary view
+    feedback_summary: bool = False
+    # Set when feedback_summary is; refreshes the view after feedback writes
+    summary_refresher: FeedbackSummaryRefresher | None = None
+    # Match search_tracks keywords against the generated tracks.search_blob
+    search_blob: bool = False
+    # track_feedback has the unique index rate_track and rate_tracks_batch
+    # upsert against
+    feedback_upsert: bool = True
 
 
 class StaticBearerTokenVerifier:
     """Simple bearer-token verifier for MCP HTTP transports."""
 
     def __init__(self, expected_token: str, client_id: str, scopes: list[str]):
-        self.expected_token = expected_token
+        # Compare fixed-size digests: constant time whatever the token length,
+        # and safe for non-ASCII tokens, which compare_digest rejects as str
+        self.expected_digest = (
+            hashlib.sha256(expected_token.encode()).digest() if expected_token else None
+        )
         self.client_id = client_id
         self.scopes = scopes
 
     async def verify_token(self, token: str) -> AccessToken | None:
-        if not self.expected_token:
+        if self.expected_digest is None:
             return None
-        if not hmac.compare_digest(token, self.expected_token):
+        digest = hashlib.sha256(token.encode()).digest()
+        if not hmac.compare_digest(digest, self.expected_digest):
             return None
         return AccessToken(
             token=token,
@@ -91,14 +490,7 @@ class StaticBearerTokenVerifier:
 @asynccontextmanager
 async def app_lifespan(server: FastMCP):
     """Manage database connection pool lifecycle."""
-    db_config = {
-        "host": os.getenv("DB_HOST", "localhost"),
-        "port": int(os.getenv("DB_PORT", "5432")),
-        "database": os.getenv("DB_NAME", "choreography"),
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD"),
-        "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
-    }
+    db_config = SETTINGS.db_params()
 
     logger.info(
         "Initializing database connection pool (host=%s port=%s db=%s user=%s)...",
@@ -108,47 +500,85 @@ async def app_lifespan(server: FastMCP):
         db_config["user"] or "<unset>",
     )
     try:
-        pool = SimpleConnectionPool(1, 10, **db_config)
+        pool_size = derive_pool_size(db_config)
+        pool = ThreadedConnectionPool(
+            SETTINGS.db_pool_min,
+            pool_size,
+            connection_factory=PreparingConnection,
+            **db_config,
+        )
     except Exception as e:
         logger.error(
             "Database connection failed. Check DB_HOST/DB_PORT/DB_NAME/"
             "DB_USER/DB_PASSWORD and that PostgreSQL is reachable."
         )
         raise RuntimeError("Failed to initialize PostgreSQL connection pool") from e
+    logger.info(
+        "Database pool size: %s-%s connections.", SETTINGS.db_pool_min, pool_size
+    )
+    feedback_summary = has_feedback_summary(pool)
+    if not feedback_summary:
+        logger.info(
+            "track_feedback_summary view not found; aggregating feedback per query "
+            "(apply migrate_add_feedback_summary.sql to precompute it)."
+        )
+    search_blob = has_search_blob(pool)
+    if not search_blob:
+        logger.info(
+            "tracks.search_blob column not found; keyword search matches each "
+            "column (apply migrate_add_search_blob.sql to index it)."
+        )
+    feedback_upsert = has_feedback_upsert_index(pool)
+    if not feedback_upsert:
+        logger.warning(
+            "track_feedback has no unique index on (%s); rate_track and "
+            "rate_tracks_batch return an error until migrate_add_audience.sql "
+            "creates idx_track_feedback_unique.",
+            _FEEDBACK_CONFLICT_KEY,
+        )
+    db_slots = threading.BoundedSemaphore(pool_size)
+    summary_refresher = (
+        FeedbackSummaryRefresher(pool, db_slots) if feedback_summary else None
+    )
+    base44_sync = Base44SyncQueue()
     try:
         logger.info("MCP server ready.")
         yield AppContext(
             db_pool=pool,
-            base44_api_key=os.getenv("BASE44_API_KEY", ""),
-            base44_api_url=os.getenv("BASE44_API_URL", "https://app.base44.com/api"),
-            base44_app_id=os.getenv("BASE44_APP_ID", ""),
+            # Tools run in worker threads; callers wait for a free slot
+            # instead of hitting "connection pool exhausted".
+            db_slots=db_slots,
+            base44_api_key=SETTINGS.base44_api_key,
+            base44_api_url=SETTINGS.base44_api_url,
+            base44_app_id=SETTINGS.base44_app_id,
+            base44_sync=base44_sync,
+            feedback_summary=feedback_summary,
+            summary_refresher=summary_refresher,
+            search_blob=search_blob,
+            feedback_upsert=feedback_upsert,
         )
     finally:
+        base44_sync.close()
+        if summary_refresher:
+            summary_refresher.close()
         pool.closeall()
         logger.info("Database pool closed.")
 
 
 # Optional MCP HTTP auth
-_auth_token = os.getenv("MCP_AUTH_BEARER_TOKEN", "").strip()
-_auth_scopes = [
-    s.strip()
-    for s in os.getenv("MCP_AUTH_SCOPES", "mcp:access").split(",")
-    if s.strip()
-]
-_auth_issuer_url = os.getenv("MCP_AUTH_ISSUER_URL", "http://127.0.0.1:8000")
-_auth_resource_url = os.getenv("MCP_AUTH_RESOURCE_URL", "http://127.0.0.1:8000")
+_auth_scopes = list(SETTINGS.auth_scopes)
 
 _auth_settings = None
 _token_verifier = None
-if _auth_token:
+if SETTINGS.auth_bearer_token:
     _auth_settings = AuthSettings(
-        issuer_url=_auth_issuer_url,
-        resource_server_url=_auth_resource_url,
+        issuer_url=SETTINGS.auth_issuer_url,
+        resource_server_url=SETTINGS.auth_resource_url,
         required_scopes=_auth_scopes,
     )
     _token_verifier = StaticBearerTokenVerifier(
-        expected_token=_auth_token,
-        client_id=os.getenv("MCP_AUTH_CLIENT_ID", "authorized-client"),
+        expected_token=SETTINGS.auth_bearer_token,
+        client_id=SETTINGS.auth_client_id,
         scopes=_auth_scopes,
     )
     logger.info(
@@ -159,28 +589,202 @@ if _auth_token:
 mcp = FastMCP(
     "choreography-db",
     lifespan=app_lifespan,
-    log_level=LOG_LEVEL,
-    host=os.getenv("MCP_HOST", "127.0.0.1"),
-    port=int(os.getenv("MCP_PORT", "8000")),
-    mount_path=os.getenv("MCP_MOUNT_PATH", "/"),
-    sse_path=os.getenv("MCP_SSE_PATH", "/sse"),
-    message_path=os.getenv("MCP_MESSAGE_PATH", "/messages/"),
-    streamable_http_path=os.getenv("MCP_HTTP_PATH", "/mcp"),
+    log_level=SETTINGS.log_level,
+    host=SETTINGS.mcp_host,
+    port=SETTINGS.mcp_port,
+    mount_path=SETTINGS.mcp_mount_path,
+    sse_path=SETTINGS.mcp_sse_path,
+    message_path=SETTINGS.mcp_message_path,
+    streamable_http_path=SETTINGS.mcp_http_path,
     auth=_auth_settings,
     token_verifier=_token_verifier,
 )
 
 
+def run_in_thread(fn):
+    """Run a blocking tool in a worker thread so it doesn't stall the event loop."""
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    return wrapper
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# Serialized results of read-only tools; MCP_TOOL_CACHE_TTL=0 disables caching.
+_TOOL_CACHE = TTLCache(maxsize=1024, ttl=SETTINGS.tool_cache_ttl)
+_MISSING = object()
+
+
+def cached_tool(fn=None, *, version=None):
+    """Cache a read-only tool's JSON result, keyed by its arguments (minus ctx).
+
+    ``version(ctx)``, when given, runs in a worker thread on every call and
+    its result joins the key, so data changed outside this process (and so
+    never clearing _TOOL_CACHE) still misses the cache.
+    """
+    if fn is None:
+        return functools.partial(cached_tool, version=version)
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (
+            fn.__name__,
+            tuple(sorted((k, v) for k, v in bound.arguments.items() if k != "ctx")),
+        )
+        if version is not None:
+            key += (await asyncio.to_thread(version, bound.arguments["ctx"]),)
+        result = _TOOL_CACHE.get(key, _MISSING)
+        if result is _MISSING:
+            result = await fn(*args, **kwargs)
+            _TOOL_CACHE.set(key, result)
+        return result
+
+    return wrapper
+
+
 def get_conn(ctx: Context):
-    """Get a connection from the pool."""
-    return ctx.request_context.lifespan_context.db_pool.getconn()
+    """Get a connection from the pool, waiting for a free slot if needed."""
+    app_ctx = ctx.request_context.lifespan_context
+    app_ctx.db_slots.acquire()
+    try:
+        return app_ctx.db_pool.getconn()
+    except Exception:
+        app_ctx.db_slots.release()
+        raise
 
 
 def put_conn(ctx: Context, conn):
     """Return a connection to the pool."""
-    ctx.request_context.lifespan_context.db_pool.putconn(conn)
+    app_ctx = ctx.request_context.lifespan_context
+    try:
+        app_ctx.db_pool.putconn(conn)
+    finally:
+        app_ctx.db_slots.release()
+
+
+# Prepared statement names, one per distinct SQL text
+_STATEMENT_NAMES: dict[str, str] = {}
+_STATEMENT_LOCK = threading.Lock()
+_PLACEHOLDER = re.compile(r"%[s%]")
+
+
+def execute_prepared(cur, sql: str, params: list[Any]) -> None:
+    """Execute a query as a named prepared statement on the cursor's connection.
+
+    Each distinct SQL text is PREPAREd once per pooled connection and then run
+    with EXECUTE, so Postgres skips parsing and planning on repeat calls. Only
+    use it for a fixed set of SQL shapes, since statements live as long as the
+    connection does.
+
+    With MCP_EXPLAIN=1, read-only statements are first run under EXPLAIN
+    (ANALYZE, BUFFERS) and the plan is logged before the real execution.
+    """
+    name = _STATEMENT_NAMES.get(sql)
+    if name is None:
+        with _STATEMENT_LOCK:
+            name = _STATEMENT_NAMES.setdefault(sql, f"mcp_stmt_{len(_STATEMENT_NAMES)}")
+
+    conn = cur.connection
+    if name not in conn.prepared:
+        counter = iter(range(1, len(params) + 1))
+        body = _PLACEHOLDER.sub(
+            lambda m: "%" if m.group() == "%%" else f"${next(counter)}", sql
+        )
+        cur.execute(f"PREPARE {name} AS {body}")
+        conn.prepared.add(name)
+
+    execute = (
+        f"EXECUTE {name} ({', '.join(['%s'] * len(params))})"
+        if params
+        else f"EXECUTE {name}"
+    )
+    if SETTINGS.explain_queries and sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        log_query_plan(cur, name, sql, execute, params)
+    cur.execute(execute, params or None)
+
+
+def log_query_plan(cur, name: str, sql: str, execute: str, params: list[Any]) -> None:
+    """Log the EXPLAIN (ANALYZE, BUFFERS) plan of a prepared statement."""
+    with cur.connection.cursor() as plan_cur:
+        plan_cur.execute(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {execute}", params or None
+        )
+        plan = plan_cur.fetchone()[0][0]
+    logger.info(
+        f"EXPLAIN {name} ({plan['Execution Time']:.1f} ms): "
+        f"{' '.join(sql.split())[:120]}\n{json.dumps(plan['Plan'], indent=2)}"
+    )
+
+
+def with_conn(ctx: Context, fn, *args, **kwargs):
+    """Call fn(conn, *args, **kwargs) with a pooled connection."""
+    conn = get_conn(ctx)
+    try:
+        return fn(conn, *args, **kwargs)
+    finally:
+        put_conn(ctx, conn)
+
+
+def fetch_feedback_version(conn) -> datetime | None:
+    """Return the latest track_feedback write time.
 
+    rate_track and sync_trackfeedback.py both stamp updated_at on every
+    insert and update, so this changes whenever feedback does.
+    """
+    cur = conn.cursor()
+    try:
+        execute_prepared(cur, "SELECT MAX(updated_at) FROM track_feedback", [])
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
 
+
+def feedback_version(ctx: Context) -> datetime | None:
+    """cached_tool version for results ranked by track feedback."""
+    return with_conn(ctx, fetch_feedback_version)
+
+
+# Hit once per DB track and again per AI suggestion while merging playlists
+@functools.lru_cache(maxsize=2048)
 def normalize_track_key(title: str | None, artist: str | None) -> str:
     t = (title or "").strip().lower()
     a = (artist or "").strip().lower()
@@ -202,47 +806,120 @@ def derive_target_track_count(
 def fetch_feedback_signals(conn, audience: str | None = None) -> dict[str, list[str]]:
     cur = conn.cursor(cursor_factory=RealDictCursor)
     try:
-        if audience:
-            cur.execute(
-                """
-                SELECT track_title, track_artist, rating
+        # Aggregated server-side; the audience filter also keeps feedback
+        # that wasn't tagged with an audience
+        execute_prepared(
+            cur,
+            r"""
+            WITH fb AS (
+                SELECT btrim(track_title, E' \t\n\r\f\v') as title,
+                       btrim(track_artist, E' \t\n\r\f\v') as artist,
+                       lower(btrim(rating, E' \t\n\r\f\v')) as rating
                 FROM track_feedback
-                WHERE audience = %s OR audience IS NULL OR audience = ''
-                """,
-                (audience,),
+                WHERE %s::text IS NULL
+                   OR audience = %s OR audience IS NULL OR audience = ''
             )
-        else:
-            cur.execute("SELECT track_title, track_artist, rating FROM track_feedback")
-        rows = cur.fetchall()
+            SELECT
+                array_agg(DISTINCT title)
+                    FILTER (WHERE rating = 'up' AND title <> '') as liked_titles,
+                array_agg(DISTINCT artist)
+                    FILTER (WHERE rating = 'up' AND artist <> '') as liked_artists,
+                array_agg(DISTINCT title)
+                    FILTER (WHERE rating = 'down' AND title <> '') as disliked_titles,
+                array_agg(DISTINCT artist)
+                    FILTER (WHERE rating = 'down' AND artist <> '') as disliked_artists
+            FROM fb
+            """,
+            [audience or None, audience or None],
+        )
+        row = cur.fetchone()
     finally:
         cur.close()
 
-    liked_titles: set[str] = set()
-    liked_artists: set[str] = set()
-    disliked_titles: set[str] = set()
-    disliked_artists: set[str] = set()
+    # array_agg gives NULL when nothing matched; sort in Python so the
+    # order doesn't depend on the database collation
+    return {name: sorted(values or []) for name, values in row.items()}
+
+
+# Columns returned as a track's full details. Listed rather than selected with
+# * so a prepared statement keeps its result type when a migration adds a
+# column, and generated query-only columns (search_blob) stay internal.
+_TRACK_COLUMNS = (
+    "id",
+    "base44_id",
+    "title",
+    "artist",
+    "album",
+    "duration_minutes",
+    "spotify_id",
+    "spotify_album_art",
+    "spotify_url",
+    "bpm",
+    "intensity",
+    "track_type",
+    "focus_area",
+    "position",
+    "base_rpm",
+    "base_effortlevel",
+    "resistance_min",
+    "resistance_max",
+    "cadence_min",
+    "cadence_max",
+    "choreography",
+    "cues",
+    "notes",
+    "synced_at",
+    "updated_at",
+    "created_at",
+)
 
-    for row in rows:
-        title = (row.get("track_title") or "").strip()
-        artist = (row.get("track_artist") or "").strip()
-        rating = (row.get("rating") or "").strip().lower()
-        if rating == "up":
-            if title:
-                liked_titles.add(title)
-            if artist:
-                liked_artists.add(artist)
-        elif rating == "down":
-            if title:
-                disliked_titles.add(title)
-            if artist:
-                disliked_artists.add(artist)
 
-    return {
-        "liked_titles": sorted(liked_titles),
-        "liked_artists": sorted(liked_artists),
-        "disliked_titles": sorted(disliked_titles),
-        "disliked_artists": sorted(disliked_artists),
-    }
+def find_catalog_tracks(
+    conn, pairs: list[tuple[str, str]]
+) -> list[dict[str, Any] | None]:
+    """Match (title, artist) pairs to tracks rows in one query.
+
+    Matching ignores case and surrounding whitespace. Returns one entry per
+    pair: the full tracks row, or None when the catalogue has no match.
+    """
+    cur = conn.cursor()
+    try:
+        execute_prepared(
+            cur,
+            f"""
+            SELECT DISTINCT ON (x.idx) x.idx as lookup_idx,
+                   {", ".join(f"t.{c}" for c in _TRACK_COLUMNS)}
+            FROM unnest(%s::text[], %s::text[])
+                 WITH ORDINALITY as x(title, artist, idx)
+            JOIN tracks t
+              ON LOWER(TRIM(t.title)) = LOWER(TRIM(x.title))
+             AND LOWER(TRIM(t.artist)) = LOWER(TRIM(x.artist))
+            ORDER BY x.idx, t.id
+            """,
+            [[title for title, _ in pairs], [artist for _, artist in pairs]],
+        )
+        by_idx = {
+            row.pop("lookup_idx"): row
+            for row in serialize_rows(cur.fetchall(), cur.description)
+        }
+    finally:
+        cur.close()
+    return [by_idx.get(idx) for idx in range(1, len(pairs) + 1)]
+
+
+def clean_text(value: Any) -> str:
+    """Strip a model-supplied value, converting only if it isn't already a str."""
+    if isinstance(value, str):
+        return value.strip()
+    return str(value or "").strip()
+
+
+# Shared across calls so OpenAI requests reuse keep-alive connections
+_OPENAI_SESSION = requests.Session()
+_OPENAI_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# Suggestions keyed by a hash of the request; OPENAI_CACHE_TTL=0 disables caching.
+_OPENAI_CACHE = TTLCache(maxsize=256, ttl=SETTINGS.openai_cache_ttl)
 
 
 def suggest_external_tracks_with_openai(
@@ -254,12 +931,12 @@ def suggest_external_tracks_with_openai(
     existing_tracks: list[dict[str, Any]],
     feedback_signals: dict[str, list[str]],
 ) -> list[dict[str, Any]]:
-    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    api_key = SETTINGS.openai_api_key
     if not api_key or needed_count <= 0:
         return []
 
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    timeout = int(os.getenv("OPENAI_TIMEOUT_SECONDS", "45"))
+    model = SETTINGS.openai_model
+    timeout = SETTINGS.openai_timeout
 
     system_prompt = (
         "You are an expert cycling class music programmer. "
@@ -289,7 +966,15 @@ def suggest_external_tracks_with_openai(
         },
     }
 
-    response = requests.post(
+    cache_key = hashlib.blake2b(
+        json.dumps([model, system_prompt, user_payload], sort_keys=True).encode(),
+        digest_size=16,
+    ).hexdigest()
+    cached = _OPENAI_CACHE.get(cache_key)
+    if cached is not None:
+        return list(cached)
+
+    response = _OPENAI_SESSION.post(
         "https://api.openai.com/v1/chat/completions",
         headers={
             "Authorization": f"Bearer {api_key}",
@@ -318,41 +1003,53 @@ def suggest_external_tracks_with_openai(
     else:
         tracks = []
 
-    clean: list[dict[str, Any]] = []
-    for item in tracks:
-        if not isinstance(item, dict):
-            continue
-        title = str(item.get("title") or "").strip()
-        artist = str(item.get("artist") or "").strip()
-        if not title or not artist:
-            continue
-        clean.append(
-            {
-                "title": title,
-                "artist": artist,
-                "estimated_bpm": item.get("estimated_bpm"),
-                "focus_area": str(item.get("focus_area") or "build").strip().lower(),
-                "notes": str(item.get("notes") or "").strip(),
-            }
-        )
-    return clean
+    clean: list[dict[str, Any]] = [
+        {
+            "title": title,
+            "artist": artist,
+            "estimated_bpm": item.get("estimated_bpm"),
+            "focus_area": clean_text(item.get("focus_area") or "build").lower(),
+            "notes": clean_text(item.get("notes")),
+        }
+        for item in tracks
+        if isinstance(item, dict)
+        and (title := clean_text(item.get("title")))
+        and (artist := clean_text(item.get("artist")))
+    ]
+    _OPENAI_CACHE.set(cache_key, clean)
+    return list(clean)
+
+
+# Keywords checked in order against a focus area or arc step; no match is a build
+_ARC_KEYWORDS = (
+    ("warm", "warmup"),
+    ("cool", "cooldown"),
+    ("recover", "recovery"),
+    ("sprint", "sprint"),
+    ("climb", "climb"),
+)
+_ARC_PHASE_NAMES = {
+    "warmup": "Warmup",
+    "cooldown": "Cooldown",
+    "recovery": "Recovery",
+    "sprint": "Peak 2",
+    "climb": "Peak 1",
+    "build": "Build",
+}
+
+
+@functools.lru_cache(maxsize=256)
+def arc_type(value: str) -> str:
+    """Map a free-text focus area or arc step to its arc type."""
+    value = value.lower()
+    for keyword, kind in _ARC_KEYWORDS:
+        if keyword in value:
+            return kind
+    return "build"
 
 
 def focus_area_to_phase_name(focus_area: str) -> str:
-    value = (focus_area or "").lower()
-    if "warm" in value:
-        return "Warmup"
-    if "cool" in value:
-        return "Cooldown"
-    if "recover" in value:
-        return "Recovery"
-    if "sprint" in value:
-        return "Peak 2"
-    if "climb" in value:
-        return "Peak 1"
-    if "build" in value or "endur" in value or "interval" in value:
-        return "Build"
-    return "Build"
+    return _ARC_PHASE_NAMES[arc_type(focus_area or "")]
 
 
 def add_track_to_phase(
@@ -386,23 +1083,150 @@ def normalize_arc_types(
     if not provided:
         return infer_default_arc(duration_minutes)
 
-    normalized: list[str] = []
-    for item in provided:
-        if "warm" in item:
-            normalized.append("warmup")
-        elif "cool" in item:
-            normalized.append("cooldown")
-        elif "recover" in item:
-            normalized.append("recovery")
-        elif "sprint" in item:
-            normalized.append("sprint")
-        elif "climb" in item:
-            normalized.append("climb")
-        elif "build" in item or "endur" in item or "interval" in item:
-            normalized.append("build")
-        else:
-            normalized.append("build")
-    return normalized
+    return [arc_type(item) for item in provided]
+
+
+# Optional search_tracks filters, in the bit order of search_tracks_sql's mask
+_SEARCH_FILTERS = (
+    "bpm >= %s",
+    "bpm <= %s",
+    "intensity = %s",
+    "track_type ILIKE %s",
+    "position ILIKE %s",
+    "artist ILIKE %s",
+    "focus_area ILIKE %s",
+    "(title ILIKE %s OR artist ILIKE %s OR album ILIKE %s OR notes ILIKE %s)",
+    "search_blob ILIKE %s",
+)
+# search_blob joins its columns with \x1f. A keyword can only match across
+# that boundary through LIKE wildcards, escapes or the separator itself, so such
+# keywords use the per-column predicate instead.
+_SEARCH_BLOB_UNSAFE = frozenset("%_\\\x1f")
+_SEARCH_SQL_CACHE: dict[int, str] = {}
+
+
+def search_tracks_sql(mask: int) -> str:
+    """Return the search_tracks query for the filters set in ``mask``."""
+    sql = _SEARCH_SQL_CACHE.get(mask)
+    if sql is None:
+        conditions = [c for bit, c in enumerate(_SEARCH_FILTERS) if mask >> bit & 1]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"""
+            SELECT title, artist, album, bpm, intensity, track_type, focus_area,
+                   position, duration_minutes, resistance_min, resistance_max,
+                   cadence_min, cadence_max, base_rpm, base_effortlevel,
+                   spotify_url
+            FROM tracks
+            {where}
+            ORDER BY title
+            LIMIT %s
+        """
+        _SEARCH_SQL_CACHE[mask] = sql
+    return sql
+
+
+# Optional suggest_tracks_for_slot filters, in the bit order of slot_tracks_sql's
+# mask; bit 6 selects the audience columns, bit 7 the feedback ranking and
+# bit 8 the precomputed track_feedback_summary counts
+_SLOT_FILTERS = (
+    "duration_minutes >= %s",
+    "duration_minutes <= %s",
+    "intensity = %s",
+    "bpm >= %s",
+    "bpm <= %s",
+    "t.title <> ALL(%s)",
+)
+_SLOT_AUDIENCE = 1 << 6
+_SLOT_TOP_RATED = 1 << 7
+_SLOT_SUMMARY = 1 << 8
+_SLOT_SQL_CACHE: dict[int, str] = {}
+
+
+def slot_tracks_sql(mask: int) -> str:
+    """Return the suggest_tracks_for_slot query for the options set in ``mask``."""
+    sql = _SLOT_SQL_CACHE.get(mask)
+    if sql is not None:
+        return sql
+
+    conditions = ["track_type ILIKE %s"]
+    conditions.extend(c for bit, c in enumerate(_SLOT_FILTERS) if mask >> bit & 1)
+    where = f"WHERE {' AND '.join(conditions)}"
+
+    order = (
+        """
+            ORDER BY
+                CASE WHEN fb.down_audience > 0 THEN 4
+                     WHEN fb.up_audience > 0 AND fb.down_count = 0 THEN 0
+                     WHEN fb.up_count > 0 AND fb.down_count = 0 THEN 1
+                     WHEN fb.up_count > fb.down_count THEN 2
+                     WHEN fb.up_count = 0 AND fb.down_count = 0 THEN 3
+                     ELSE 4
+                END,
+                t.title
+        """
+        if mask & _SLOT_TOP_RATED
+        else "ORDER BY t.title"
+    )
+
+    audience_cols = ""
+    if mask & _SLOT_AUDIENCE:
+        audience_cols = (
+            ", COALESCE(fb.up_audience, 0) as audience_thumbs_up, "
+            "COALESCE(fb.down_audience, 0) as audience_thumbs_down"
+        )
+
+    if mask & _SLOT_AUDIENCE and mask & _SLOT_SUMMARY:
+        audience_sums = """,
+                   COALESCE((up_by_audience ->> %s)::bigint, 0) as up_audience,
+                   COALESCE((down_by_audience ->> %s)::bigint, 0) as down_audience"""
+    elif mask & _SLOT_AUDIENCE:
+        audience_sums = """,
+                   SUM(
+                       CASE WHEN rating = 'up' AND audience = %s
+                       THEN 1 ELSE 0
+                   END) as up_audience,
+                   SUM(
+                       CASE WHEN rating = 'down' AND audience = %s
+                       THEN 1 ELSE 0
+                   END) as down_audience"""
+    else:
+        audience_sums = """,
+                   0 as up_audience,
+                   0 as down_audience"""
+
+    if mask & _SLOT_SUMMARY:
+        feedback = f"""
+                SELECT track_title, up_count, down_count
+                       {audience_sums}
+                FROM track_feedback_summary"""
+    else:
+        feedback = f"""
+                SELECT track_title,
+                       SUM(CASE WHEN rating = 'up' THEN 1 ELSE 0 END) as up_count,
+                       SUM(CASE WHEN rating = 'down' THEN 1 ELSE 0 END) as down_count
+                       {audience_sums}
+                FROM track_feedback
+                GROUP BY track_title"""
+
+    sql = f"""
+            SELECT t.id, t.spotify_id,
+                   t.title, t.artist, t.bpm, t.intensity, t.track_type,
+                   t.duration_minutes, t.position, t.focus_area,
+                   t.resistance_min, t.resistance_max,
+                   t.cadence_min, t.cadence_max,
+                   t.spotify_url,
+                   COALESCE(fb.up_count, 0) as thumbs_up,
+                   COALESCE(fb.down_count, 0) as thumbs_down
+                   {audience_cols}
+            FROM tracks t
+            LEFT JOIN ({feedback}
+            ) fb ON fb.track_title = t.title
+            {where}
+            {order}
+            LIMIT %s
+        """
+    _SLOT_SQL_CACHE[mask] = sql
+    return sql
 
 
 # ---------------------------------------------------------------------------
@@ -411,6 +1235,8 @@ def normalize_arc_types(
 
 
 @mcp.tool()
+@cached_tool
+@run_in_thread
 def search_tracks(
     ctx: Context,
     bpm_min: float | None = None,
@@ -443,63 +1269,55 @@ def search_tracks(
     """
     conn = get_conn(ctx)
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        conditions = []
-        params = []
+        cur = conn.cursor()
+        mask = 0
+        params: list[Any] = []
 
         if bpm_min is not None:
-            conditions.append("bpm >= %s")
+            mask |= 1 << 0
             params.append(bpm_min)
         if bpm_max is not None:
-            conditions.append("bpm <= %s")
+            mask |= 1 << 1
             params.append(bpm_max)
         if intensity:
-            conditions.append("intensity = %s")
+            mask |= 1 << 2
             params.append(intensity)
         if track_type:
-            conditions.append("track_type ILIKE %s")
+            mask |= 1 << 3
             params.append(f"%{track_type}%")
         if position:
-            conditions.append("position ILIKE %s")
+            mask |= 1 << 4
             params.append(f"%{position}%")
         if artist:
-            conditions.append("artist ILIKE %s")
+            mask |= 1 << 5
             params.append(f"%{artist}%")
         if focus_area:
-            conditions.append("focus_area ILIKE %s")
+            mask |= 1 << 6
             params.append(f"%{focus_area}%")
         if keyword:
-            conditions.append(
-                "(title ILIKE %s OR artist ILIKE %s OR album ILIKE %s OR notes ILIKE %s)"
-            )
             kw = f"%{keyword}%"
-            params.extend([kw, kw, kw, kw])
+            if ctx.request_context.lifespan_context.search_blob and not (
+                _SEARCH_BLOB_UNSAFE & set(keyword)
+            ):
+                # One trigram-indexed predicate over title/artist/album/notes
+                mask |= 1 << 8
+                params.append(kw)
+            else:
+                mask |= 1 << 7
+                params.extend([kw, kw, kw, kw])
 
-        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         params.append(min(limit, 50))
+        execute_prepared(cur, search_tracks_sql(mask), params)
 
-        cur.execute(
-            f"""
-            SELECT title, artist, album, bpm, intensity, track_type, focus_area,
-                   position, duration_minutes, resistance_min, resistance_max,
-                   cadence_min, cadence_max, base_rpm, base_effortlevel,
-                   spotify_url
-            FROM tracks
-            {where}
-            ORDER BY title
-            LIMIT %s
-        """,
-            params,
-        )
-
-        rows = serialize_rows(cur.fetchall())
+        rows = serialize_rows(cur.fetchall(), cur.description)
         cur.close()
-        return json.dumps(rows, indent=2)
+        return to_json(rows)
     finally:
         put_conn(ctx, conn)
 
 
 @mcp.tool()
+@run_in_thread
 def suggest_tracks_for_slot(
     ctx: Context,
     slot_type: str,
@@ -536,110 +1354,49 @@ def suggest_tracks_for_slot(
     """
     conn = get_conn(ctx)
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        conditions = ["track_type ILIKE %s"]
-        params = [f"%{slot_type}%"]
+        cur = conn.cursor()
+        mask = 0
+        params: list[Any] = [f"%{slot_type}%"]
 
         if duration_min is not None:
-            conditions.append("duration_minutes >= %s")
+            mask |= 1 << 0
             params.append(duration_min)
         if duration_max is not None:
-            conditions.append("duration_minutes <= %s")
+            mask |= 1 << 1
             params.append(duration_max)
         if intensity:
-            conditions.append("intensity = %s")
+            mask |= 1 << 2
             params.append(intensity)
         if bpm_min is not None:
-            conditions.append("bpm >= %s")
+            mask |= 1 << 3
             params.append(bpm_min)
         if bpm_max is not None:
-            conditions.append("bpm <= %s")
+            mask |= 1 << 4
             params.append(bpm_max)
         if exclude_titles:
-            titles = [t.strip() for t in exclude_titles.split(",")]
-            placeholders = ",".join(["%s"] * len(titles))
-            conditions.append(f"t.title NOT IN ({placeholders})")
-            params.extend(titles)
-
-        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
-
-        all_params = list(params)
-        all_params.append(min(limit, 50))
-
-        order = (
-            """
-            ORDER BY
-                CASE WHEN fb.down_audience > 0 THEN 4
-                     WHEN fb.up_audience > 0 AND fb.down_count = 0 THEN 0
-                     WHEN fb.up_count > 0 AND fb.down_count = 0 THEN 1
-                     WHEN fb.up_count > fb.down_count THEN 2
-                     WHEN fb.up_count = 0 AND fb.down_count = 0 THEN 3
-                     ELSE 4
-                END,
-                t.title
-        """
-            if prefer_top_rated
-            else "ORDER BY t.title"
-        )
-
-        audience_cols = ""
-        audience_sums = ""
+            mask |= 1 << 5
+            params.append([t.strip() for t in exclude_titles.split(",")])
         if audience:
-            audience_cols = (
-                ", COALESCE(fb.up_audience, 0) as audience_thumbs_up, "
-                "COALESCE(fb.down_audience, 0) as audience_thumbs_down"
-            )
-            audience_sums = """,
-                       SUM(
-                           CASE WHEN rating = 'up' AND audience = %s
-                           THEN 1 ELSE 0
-                       END) as up_audience,
-                       SUM(
-                           CASE WHEN rating = 'down' AND audience = %s
-                           THEN 1 ELSE 0
-                       END) as down_audience"""
-            all_params = [audience, audience] + params
-            all_params.append(min(limit, 50))
-        else:
-            audience_sums = """,
-                       0 as up_audience,
-                       0 as down_audience"""
+            mask |= _SLOT_AUDIENCE
+            params = [audience, audience] + params
+        if ctx.request_context.lifespan_context.feedback_summary:
+            mask |= _SLOT_SUMMARY
+        if prefer_top_rated:
+            mask |= _SLOT_TOP_RATED
 
-        cur.execute(
-            f"""
-            SELECT t.id, t.spotify_id,
-                   t.title, t.artist, t.bpm, t.intensity, t.track_type,
-                   t.duration_minutes, t.position, t.focus_area,
-                   t.resistance_min, t.resistance_max,
-                   t.cadence_min, t.cadence_max,
-                   t.spotify_url,
-                   COALESCE(fb.up_count, 0) as thumbs_up,
-                   COALESCE(fb.down_count, 0) as thumbs_down
-                   {audience_cols}
-            FROM tracks t
-            LEFT JOIN (
-                SELECT track_title,
-                       SUM(CASE WHEN rating = 'up' THEN 1 ELSE 0 END) as up_count,
-                       SUM(CASE WHEN rating = 'down' THEN 1 ELSE 0 END) as down_count
-                       {audience_sums}
-                FROM track_feedback
-                GROUP BY track_title
-            ) fb ON fb.track_title = t.title
-            {where}
-            {order}
-            LIMIT %s
-        """,
-            all_params,
-        )
+        params.append(min(limit, 50))
+        execute_prepared(cur, slot_tracks_sql(mask), params)
 
-        rows = serialize_rows(cur.fetchall())
+        rows = serialize_rows(cur.fetchall(), cur.description)
         cur.close()
-        return json.dumps(rows, indent=2)
+        return to_json(rows)
     finally:
         put_conn(ctx, conn)
 
 
 @mcp.tool()
+@cached_tool
+@run_in_thread
 def find_similar_tracks(
     ctx: Context,
     track_title: str,
@@ -657,69 +1414,76 @@ def find_similar_tracks(
     """
     conn = get_conn(ctx)
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor()
 
-        # Get the reference track
-        cur.execute(
-            "SELECT * FROM tracks WHERE title ILIKE %s LIMIT 1", (f"%{track_title}%",)
-        )
-        ref = cur.fetchone()
-
-        if not ref:
-            cur.close()
-            return json.dumps({"error": f"Track '{track_title}' not found"})
-
-        conditions = ["t.title != %s"]
-        params = [ref["title"]]
-
-        if ref["bpm"]:
-            conditions.append("t.bpm BETWEEN %s AND %s")
-            params.extend(
-                [float(ref["bpm"]) - bpm_tolerance, float(ref["bpm"]) + bpm_tolerance]
+        # Resolve the reference track and its neighbours in one round-trip;
+        # the LEFT JOIN keeps the reference row when nothing is similar
+        execute_prepared(
+            cur,
+            """
+            WITH ref AS (
+                SELECT title, artist, bpm, intensity, track_type
+                FROM tracks
+                WHERE title ILIKE %s
+                LIMIT 1
             )
-
-        if ref["intensity"]:
-            conditions.append("t.intensity = %s")
-            params.append(ref["intensity"])
-
-        where = f"WHERE {' AND '.join(conditions)}"
-        safe_limit = min(limit, 50)
-
-        cur.execute(
-            f"""
-            SELECT t.title, t.artist, t.bpm, t.intensity, t.track_type,
+            SELECT ref.title as ref_title, ref.artist as ref_artist,
+                   ref.bpm as ref_bpm, ref.intensity as ref_intensity,
+                   ref.track_type as ref_track_type,
+                   t.title, t.artist, t.bpm, t.intensity, t.track_type,
                    t.duration_minutes, t.position, t.focus_area,
-                   t.spotify_url,
-                   ABS(t.bpm - %s) as bpm_diff
-            FROM tracks t
-            {where}
-            ORDER BY ABS(t.bpm - %s), t.title
-            LIMIT %s
+                   t.spotify_url, t.bpm_diff
+            FROM ref
+            LEFT JOIN LATERAL (
+                SELECT t.title, t.artist, t.bpm, t.intensity, t.track_type,
+                       t.duration_minutes, t.position, t.focus_area,
+                       t.spotify_url,
+                       ABS(t.bpm - ref.bpm) as bpm_diff
+                FROM tracks t
+                WHERE t.title != ref.title
+                  AND (COALESCE(ref.bpm, 0) = 0
+                       OR t.bpm BETWEEN ref.bpm - %s AND ref.bpm + %s)
+                  AND (COALESCE(ref.intensity, '') = ''
+                       OR t.intensity = ref.intensity)
+                ORDER BY ABS(t.bpm - ref.bpm), t.title
+                LIMIT %s
+            ) t ON true
+            ORDER BY t.bpm_diff, t.title
         """,
-            [ref["bpm"]] + params + [ref["bpm"], safe_limit],
+            [f"%{track_title}%", bpm_tolerance, bpm_tolerance, min(limit, 50)],
         )
-
-        rows = serialize_rows(cur.fetchall())
+        rows = serialize_rows(cur.fetchall(), cur.description)
         cur.close()
 
-        return json.dumps(
+        if not rows:
+            return to_json({"error": f"Track '{track_title}' not found"})
+
+        ref = rows[0]
+        similar = [
+            {k: v for k, v in row.items() if not k.startswith("ref_")}
+            for row in rows
+            if row["title"] is not None
+        ]
+
+        return to_json(
             {
                 "reference_track": {
-                    "title": ref["title"],
-                    "artist": ref["artist"],
-                    "bpm": serialize(ref["bpm"]),
-                    "intensity": ref["intensity"],
-                    "track_type": ref["track_type"],
+                    "title": ref["ref_title"],
+                    "artist": ref["ref_artist"],
+                    "bpm": ref["ref_bpm"],
+                    "intensity": ref["ref_intensity"],
+                    "track_type": ref["ref_track_type"],
                 },
-                "similar_tracks": rows,
+                "similar_tracks": similar,
             },
-            indent=2,
         )
     finally:
         put_conn(ctx, conn)
 
 
 @mcp.tool()
+@cached_tool
+@run_in_thread
 def get_track_details(ctx: Context, track_title: str) -> str:
     """Get full details of a track including choreography cues.
 
@@ -732,22 +1496,26 @@ def get_track_details(ctx: Context, track_title: str) -> str:
     conn = get_conn(ctx)
     try:
         cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute(
-            "SELECT * FROM tracks WHERE title ILIKE %s LIMIT 1", (f"%{track_title}%",)
+        execute_prepared(
+            cur,
+            f"SELECT {', '.join(_TRACK_COLUMNS)} FROM tracks"
+            " WHERE title ILIKE %s LIMIT 1",
+            [f"%{track_title}%"],
         )
         row = cur.fetchone()
         cur.close()
 
         if not row:
-            return json.dumps({"error": f"Track '{track_title}' not found"})
+            return to_json({"error": f"Track '{track_title}' not found"})
 
-        result = {k: serialize(v) for k, v in row.items()}
-        return json.dumps(result, indent=2)
+        return to_json({k: serialize(v) for k, v in row.items()})
     finally:
         put_conn(ctx, conn)
 
 
 @mcp.tool()
+@cached_tool
+@run_in_thread
 def get_top_rated_tracks(
     ctx: Context,
     context: str | None = None,
@@ -768,7 +1536,7 @@ def get_top_rated_tracks(
     """
     conn = get_conn(ctx)
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor()
         conditions = ["f.rating = %s"]
         params = [rating]
 
@@ -782,7 +1550,8 @@ def get_top_rated_tracks(
         where = f"WHERE {' AND '.join(conditions)}"
         params.append(min(limit, 50))
 
-        cur.execute(
+        execute_prepared(
+            cur,
             f"""
             SELECT f.track_title, f.track_artist, f.context, f.audience, f.rating,
                    COUNT(*) as rating_count,
@@ -800,14 +1569,16 @@ def get_top_rated_tracks(
             params,
         )
 
-        rows = serialize_rows(cur.fetchall())
+        rows = serialize_rows(cur.fetchall(), cur.description)
         cur.close()
-        return json.dumps(rows, indent=2)
+        return to_json(rows)
     finally:
         put_conn(ctx, conn)
 
 
 @mcp.tool()
+@cached_tool
+@run_in_thread
 def get_feedback_summary(ctx: Context) -> str:
     """Get a summary of all track feedback grouped by context and rating.
 
@@ -816,45 +1587,284 @@ def get_feedback_summary(ctx: Context) -> str:
     """
     conn = get_conn(ctx)
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor()
 
-        # Overall stats
-        cur.execute("""
-            SELECT
-                COUNT(*) as total_feedback,
-                SUM(CASE WHEN rating = 'up' THEN 1 ELSE 0 END) as total_up,
-                SUM(CASE WHEN rating = 'down' THEN 1 ELSE 0 END) as total_down,
-                COUNT(DISTINCT track_title) as unique_tracks
-            FROM track_feedback
-        """)
-        overall = serialize_rows(cur.fetchall())[0]
-
-        # By context
-        cur.execute("""
+        # Overall stats and per-context stats in one scan: the grand-total
+        # row of the grouping sets comes first, flagged by GROUPING(context)
+        execute_prepared(
+            cur,
+            """
             SELECT
+                GROUPING(context) as is_overall,
                 COALESCE(context, 'unspecified') as context,
+                COUNT(*) as total_feedback,
                 SUM(CASE WHEN rating = 'up' THEN 1 ELSE 0 END) as up_count,
                 SUM(CASE WHEN rating = 'down' THEN 1 ELSE 0 END) as down_count,
                 COUNT(DISTINCT track_title) as unique_tracks
             FROM track_feedback
-            GROUP BY context
-            ORDER BY COUNT(*) DESC
-        """)
-        by_context = serialize_rows(cur.fetchall())
+            GROUP BY GROUPING SETS ((), (context))
+            ORDER BY GROUPING(context) DESC, COUNT(*) DESC
+        """,
+            [],
+        )
+        rows = serialize_rows(cur.fetchall(), cur.description)
         cur.close()
 
-        return json.dumps(
+        totals = rows[0]
+        overall = {
+            "total_feedback": totals["total_feedback"],
+            "total_up": totals["up_count"],
+            "total_down": totals["down_count"],
+            "unique_tracks": totals["unique_tracks"],
+        }
+        by_context = [
+            {
+                "context": row["context"],
+                "up_count": row["up_count"],
+                "down_count": row["down_count"],
+                "unique_tracks": row["unique_tracks"],
+            }
+            for row in rows[1:]
+        ]
+
+        return to_json(
             {
                 "overall": overall,
                 "by_context": by_context,
             },
-            indent=2,
         )
     finally:
         put_conn(ctx, conn)
 
 
+# Class phases by duration; shared across calls, so treat them as read-only
+_SHORT_CLASS_STRUCTURE = (
+    {"phase": "Warmup", "types": ("warmup",), "count": 1},
+    {"phase": "Build", "types": ("endurance", "intervals"), "count": 2},
+    {"phase": "Peak", "types": ("climb", "sprint", "intervals"), "count": 2},
+    {"phase": "Cooldown", "types": ("cooldown", "recovery"), "count": 1},
+)
+_MEDIUM_CLASS_STRUCTURE = (
+    {"phase": "Warmup", "types": ("warmup",), "count": 1},
+    {"phase": "Build", "types": ("endurance", "intervals"), "count": 2},
+    {"phase": "Peak 1", "types": ("climb", "sprint"), "count": 2},
+    {"phase": "Recovery", "types": ("recovery",), "count": 1},
+    {"phase": "Peak 2", "types": ("climb", "sprint", "intervals"), "count": 2},
+    {"phase": "Cooldown", "types": ("cooldown", "recovery"), "count": 1},
+)
+_LONG_CLASS_STRUCTURE = (
+    {"phase": "Warmup", "types": ("warmup",), "count": 2},
+    {"phase": "Build", "types": ("endurance", "intervals"), "count": 2},
+    {"phase": "Peak 1", "types": ("climb", "sprint"), "count": 2},
+    {"phase": "Active Recovery", "types": ("recovery", "endurance"), "count": 1},
+    {"phase": "Peak 2", "types": ("climb", "sprint", "intervals"), "count": 2},
+    {"phase": "Recovery", "types": ("recovery",), "count": 1},
+    {"phase": "Peak 3", "types": ("climb", "sprint"), "count": 1},
+    {"phase": "Cooldown", "types": ("cooldown", "recovery"), "count": 1},
+)
+
+# Intensity levels preferred for each difficulty
+_DIFFICULTY_INTENSITIES = {
+    "beginner": ("low", "medium"),
+    "intermediate": ("medium", "high"),
+    "advanced": ("high", "extreme"),
+    "expert": ("high", "extreme"),
+}
+
+
+def class_structure(duration_minutes: int) -> tuple[dict[str, Any], ...]:
+    """Return the class phases for a class of ``duration_minutes``."""
+    if duration_minutes <= 30:
+        return _SHORT_CLASS_STRUCTURE
+    if duration_minutes <= 45:
+        return _MEDIUM_CLASS_STRUCTURE
+    return _LONG_CLASS_STRUCTURE
+
+
+# Drops tracks that fetch_feedback_signals would report as disliked, matching
+# the trimmed, lower-cased title or artist
+_DISLIKED_TRACK_CLAUSE = r"""
+            AND btrim(t.title, E' \t\n\r\f\v') <> ''
+            AND btrim(t.artist, E' \t\n\r\f\v') <> ''
+            AND NOT EXISTS (
+                SELECT 1 FROM track_feedback d
+                WHERE lower(btrim(d.rating, E' \t\n\r\f\v')) = 'down'
+                  AND (%s::text IS NULL OR d.audience = %s
+                       OR d.audience IS NULL OR d.audience = '')
+                  AND lower(btrim(d.track_title, E' \t\n\r\f\v'))
+                      = lower(btrim(t.title, E' \t\n\r\f\v'))
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM track_feedback d
+                WHERE lower(btrim(d.rating, E' \t\n\r\f\v')) = 'down'
+                  AND (%s::text IS NULL OR d.audience = %s
+                       OR d.audience IS NULL OR d.audience = '')
+                  AND lower(btrim(d.track_artist, E' \t\n\r\f\v'))
+                      = lower(btrim(t.artist, E' \t\n\r\f\v'))
+            )"""
+
+
+def compose_class_playlist(
+    conn,
+    duration_minutes: int,
+    difficulty: str | None,
+    theme: str | None,
+    audience: str | None,
+    feedback_summary: bool = False,
+    exclude_disliked: bool = False,
+) -> dict[str, Any]:
+    """Build the class playlist structure for build_class_playlist.
+
+    With exclude_disliked, tracks whose title or artist was rated down (for
+    the audience, as in fetch_feedback_signals) are filtered out before each
+    phase takes its tracks, as are tracks without a title or artist.
+    """
+    cur = conn.cursor()
+
+    structure = class_structure(duration_minutes)
+    preferred_intensities = (
+        list(_DIFFICULTY_INTENSITIES.get(difficulty, ())) if difficulty else []
+    )
+
+    params: list[Any] = []
+
+    # Audience-aware feedback subquery params come first
+    audience_sums = ""
+    audience_rank = "0"
+    if audience and feedback_summary:
+        audience_sums = """,
+                   COALESCE((down_by_audience ->> %s)::bigint, 0) as down_audience"""
+    elif audience:
+        audience_sums = """,
+                   SUM(
+                       CASE WHEN rating = 'down' AND audience = %s
+                       THEN 1 ELSE 0
+                   END) as down_audience"""
+    if audience:
+        audience_rank = "CASE WHEN COALESCE(fb.down_audience, 0) > 0 THEN -1 ELSE 0 END"
+        params.append(audience)
+
+    if feedback_summary:
+        feedback_source = f"""
+            SELECT track_title, up_count, down_count
+                   {audience_sums}
+            FROM track_feedback_summary"""
+    else:
+        feedback_source = f"""
+            SELECT track_title,
+                   SUM(CASE WHEN rating = 'up' THEN 1 ELSE 0 END) as up_count,
+                   SUM(CASE WHEN rating = 'down' THEN 1 ELSE 0 END) as down_count
+                   {audience_sums}
+            FROM track_feedback
+            GROUP BY track_title"""
+
+    # Each phase ranks enough distinct titles to fill its own slots even if
+    # every track picked by the earlier phases ranks ahead of them
+    slot_rows = []
+    depth = 0
+    for idx, slot in enumerate(structure):
+        depth += slot["count"]
+        slot_rows.append("(%s::int, %s::text[], %s::int)")
+        params.extend([idx, list(slot["types"]), depth])
+
+    intensity_clause = ""
+    if preferred_intensities:
+        intensity_clause = "AND t.intensity = ANY(%s)"
+        params.append(preferred_intensities)
+
+    theme_clause = ""
+    if theme:
+        theme_clause = "AND (t.notes ILIKE %s OR t.focus_area ILIKE %s)"
+        params.extend([f"%{theme}%", f"%{theme}%"])
+
+    disliked_clause = ""
+    if exclude_disliked:
+        disliked_clause = _DISLIKED_TRACK_CLAUSE
+        params.extend([audience or None, audience or None] * 2)
+
+    execute_prepared(
+        cur,
+        f"""
+        WITH fb AS MATERIALIZED ({feedback_source}
+        ),
+        slots(phase_idx, types, depth) AS (
+            VALUES {", ".join(slot_rows)}
+        )
+        SELECT s.phase_idx, c.id, c.spotify_id, c.title, c.artist, c.bpm,
+               c.intensity, c.track_type, c.duration_minutes, c.position,
+               c.focus_area, c.resistance_min, c.resistance_max,
+               c.cadence_min, c.cadence_max, c.spotify_url,
+               c.thumbs_up, c.thumbs_down
+        FROM slots s
+        -- Keep each phase's best row per title before taking its depth, so
+        -- catalogue rows sharing a title can't crowd out the tracks the
+        -- phase needs once earlier phases' titles are skipped
+        CROSS JOIN LATERAL (
+            SELECT *
+            FROM (
+                SELECT DISTINCT ON (t.title)
+                       t.id, t.spotify_id,
+                       t.title, t.artist, t.bpm, t.intensity, t.track_type,
+                       t.duration_minutes, t.position, t.focus_area,
+                       t.resistance_min, t.resistance_max,
+                       t.cadence_min, t.cadence_max,
+                       t.spotify_url,
+                       COALESCE(fb.up_count, 0) as thumbs_up,
+                       COALESCE(fb.down_count, 0) as thumbs_down,
+                       {audience_rank} as audience_rank,
+                       RANDOM() as shuffle
+                FROM tracks t
+                LEFT JOIN fb ON fb.track_title = t.title
+                WHERE LOWER(t.track_type) = ANY(s.types)
+                {intensity_clause}
+                {theme_clause}
+                {disliked_clause}
+                ORDER BY t.title, audience_rank DESC, thumbs_up DESC, shuffle
+            ) ranked
+            ORDER BY audience_rank DESC, thumbs_up DESC, shuffle
+            LIMIT s.depth
+        ) c
+        ORDER BY s.phase_idx, c.audience_rank DESC, c.thumbs_up DESC, c.shuffle
+    """,
+        params,
+    )
+
+    candidates: list[list[dict[str, Any]]] = [[] for _ in structure]
+    for row in serialize_rows(cur.fetchall(), cur.description):
+        candidates[int(row.pop("phase_idx"))].append(row)
+
+    # Fill the phases in order, skipping tracks an earlier phase already used,
+    # and total their durations as they are picked
+    used_titles: set[str] = set()
+    playlist = []
+    total = 0
+    for slot, ranked in zip(structure, candidates):
+        tracks = [t for t in ranked if t["title"] not in used_titles][: slot["count"]]
+        for t in tracks:
+            used_titles.add(t["title"])
+            total += t["duration_minutes"] or 0
+        playlist.append(
+            {
+                "phase": slot["phase"],
+                "suggested_types": slot["types"],
+                "tracks": tracks,
+            }
+        )
+
+    cur.close()
+
+    return {
+        "target_duration": duration_minutes,
+        "estimated_duration": round(total, 1),
+        "difficulty": difficulty,
+        "theme": theme,
+        "playlist": playlist,
+    }
+
+
 @mcp.tool()
+@cached_tool(version=feedback_version)
+@run_in_thread
 def build_class_playlist(
     ctx: Context,
     duration_minutes: int = 45,
@@ -878,239 +1888,79 @@ def build_class_playlist(
     """
     conn = get_conn(ctx)
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Define class structure based on duration
-        if duration_minutes <= 30:
-            structure = [
-                {"phase": "Warmup", "types": ["warmup"], "count": 1},
-                {"phase": "Build", "types": ["endurance", "intervals"], "count": 2},
-                {
-                    "phase": "Peak",
-                    "types": ["climb", "sprint", "intervals"],
-                    "count": 2,
-                },
-                {"phase": "Cooldown", "types": ["cooldown", "recovery"], "count": 1},
-            ]
-        elif duration_minutes <= 45:
-            structure = [
-                {"phase": "Warmup", "types": ["warmup"], "count": 1},
-                {"phase": "Build", "types": ["endurance", "intervals"], "count": 2},
-                {"phase": "Peak 1", "types": ["climb", "sprint"], "count": 2},
-                {"phase": "Recovery", "types": ["recovery"], "count": 1},
-                {
-                    "phase": "Peak 2",
-                    "types": ["climb", "sprint", "intervals"],
-                    "count": 2,
-                },
-                {"phase": "Cooldown", "types": ["cooldown", "recovery"], "count": 1},
-            ]
-        else:
-            structure = [
-                {"phase": "Warmup", "types": ["warmup"], "count": 2},
-                {"phase": "Build", "types": ["endurance", "intervals"], "count": 2},
-                {"phase": "Peak 1", "types": ["climb", "sprint"], "count": 2},
-                {
-                    "phase": "Active Recovery",
-                    "types": ["recovery", "endurance"],
-                    "count": 1,
-                },
-                {
-                    "phase": "Peak 2",
-                    "types": ["climb", "sprint", "intervals"],
-                    "count": 2,
-                },
-                {"phase": "Recovery", "types": ["recovery"], "count": 1},
-                {"phase": "Peak 3", "types": ["climb", "sprint"], "count": 1},
-                {"phase": "Cooldown", "types": ["cooldown", "recovery"], "count": 1},
-            ]
-
-        # Map difficulty to intensity preferences
-        intensity_map = {
-            "beginner": ["low", "medium"],
-            "intermediate": ["medium", "high"],
-            "advanced": ["high", "extreme"],
-            "expert": ["high", "extreme"],
-        }
-        preferred_intensities = intensity_map.get(difficulty, []) if difficulty else []
-
-        used_titles = set()
-        playlist = []
-
-        for slot in structure:
-            type_placeholders = ",".join(["%s"] * len(slot["types"]))
-            params = []
-
-            # Audience-aware feedback subquery params come first
-            audience_sums = ""
-            audience_order = ""
-            if audience:
-                audience_sums = """,
-                           SUM(
-                               CASE WHEN rating = 'down' AND audience = %s
-                               THEN 1 ELSE 0
-                           END) as down_audience"""
-                audience_order = (
-                    "CASE WHEN COALESCE(fb.down_audience, 0) > 0 "
-                    "THEN -1 ELSE 0 END DESC,"
-                )
-                params.append(audience)
-
-            params.extend(slot["types"])
-
-            intensity_clause = ""
-            if preferred_intensities:
-                int_placeholders = ",".join(["%s"] * len(preferred_intensities))
-                intensity_clause = f"AND t.intensity IN ({int_placeholders})"
-                params.extend(preferred_intensities)
-
-            theme_clause = ""
-            if theme:
-                theme_clause = "AND (t.notes ILIKE %s OR t.focus_area ILIKE %s)"
-                params.extend([f"%{theme}%", f"%{theme}%"])
-
-            # Exclude already-used tracks
-            exclude_clause = ""
-            if used_titles:
-                exclude_placeholders = ",".join(["%s"] * len(used_titles))
-                exclude_clause = f"AND t.title NOT IN ({exclude_placeholders})"
-                params.extend(list(used_titles))
-
-            params.append(slot["count"])
-
-            cur.execute(
-                f"""
-                SELECT t.id, t.spotify_id,
-                       t.title, t.artist, t.bpm, t.intensity, t.track_type,
-                       t.duration_minutes, t.position, t.focus_area,
-                       t.resistance_min, t.resistance_max,
-                       t.cadence_min, t.cadence_max,
-                       t.spotify_url,
-                       COALESCE(fb.up_count, 0) as thumbs_up,
-                       COALESCE(fb.down_count, 0) as thumbs_down
-                FROM tracks t
-                LEFT JOIN (
-                    SELECT track_title,
-                           SUM(CASE WHEN rating = 'up' THEN 1 ELSE 0 END) as up_count,
-                           SUM(CASE WHEN rating = 'down' THEN 1 ELSE 0 END) as down_count
-                           {audience_sums}
-                    FROM track_feedback
-                    GROUP BY track_title
-                ) fb ON fb.track_title = t.title
-                WHERE t.track_type ILIKE ANY(ARRAY[{type_placeholders}])
-                {intensity_clause}
-                {theme_clause}
-                {exclude_clause}
-                ORDER BY
-                    {audience_order}
-                    COALESCE(fb.up_count, 0) DESC,
-                    RANDOM()
-                LIMIT %s
-            """,
-                params,
-            )
-
-            tracks = serialize_rows(cur.fetchall())
-            for t in tracks:
-                used_titles.add(t["title"])
-
-            playlist.append(
-                {
-                    "phase": slot["phase"],
-                    "suggested_types": slot["types"],
-                    "tracks": tracks,
-                }
-            )
-
-        cur.close()
-
-        # Calculate total duration
-        total = sum(
-            t.get("duration_minutes", 0) or 0
-            for phase in playlist
-            for t in phase["tracks"]
-        )
-
-        return json.dumps(
-            {
-                "target_duration": duration_minutes,
-                "estimated_duration": round(total, 1),
-                "difficulty": difficulty,
-                "theme": theme,
-                "playlist": playlist,
-            },
-            indent=2,
+        result = compose_class_playlist(
+            conn,
+            duration_minutes,
+            difficulty,
+            theme,
+            audience,
+            feedback_summary=ctx.request_context.lifespan_context.feedback_summary,
         )
     finally:
         put_conn(ctx, conn)
+    return to_json(result)
+
+
+# tracks columns copied onto AI suggestions found in the catalogue; focus_area
+# and notes stay as the model gave them, since they place the track in the arc
+_CATALOG_FIELDS = (
+    "id",
+    "spotify_id",
+    "title",
+    "artist",
+    "bpm",
+    "intensity",
+    "track_type",
+    "duration_minutes",
+    "position",
+    "resistance_min",
+    "resistance_max",
+    "cadence_min",
+    "cadence_max",
+    "spotify_url",
+)
 
 
-@mcp.tool()
-def build_hybrid_playlist(
+def merge_hybrid_playlist(
     ctx: Context,
-    duration_minutes: int = 45,
-    difficulty: str | None = None,
-    theme: str | None = None,
-    audience: str | None = None,
-    target_tracks: int | None = None,
+    base: dict[str, Any],
+    feedback: dict[str, list[str]],
+    duration_minutes: int,
+    difficulty: str | None,
+    theme: str | None,
+    audience: str | None,
+    target_tracks: int | None,
 ) -> str:
-    """Build a full playlist using DB anchors plus OpenAI gap-fill suggestions.
+    """Gap-fill the DB playlist with OpenAI tracks.
 
-    This tool:
-    1) Builds a base playlist from local DB tracks.
-    2) Applies feedback filters to remove disliked tracks/artists.
-    3) Uses OpenAI to suggest additional tracks only when DB coverage is short.
-    4) Returns a merged, ordered playlist.
+    The base playlist must come from compose_class_playlist with
+    exclude_disliked set, so disliked DB tracks are already gone. AI
+    suggestions that are already in the catalogue take its track details.
     """
-    base_raw = build_class_playlist(
-        ctx,
-        duration_minutes=duration_minutes,
-        difficulty=difficulty,
-        theme=theme,
-        audience=audience,
-    )
-    base = json.loads(base_raw)
-    playlist = base.get("playlist", []) if isinstance(base, dict) else []
-
-    conn = get_conn(ctx)
-    try:
-        feedback = fetch_feedback_signals(conn, audience=audience)
-    finally:
-        put_conn(ctx, conn)
+    playlist = base["playlist"]
 
     disliked_titles = {t.lower().strip() for t in feedback.get("disliked_titles", [])}
     disliked_artists = {a.lower().strip() for a in feedback.get("disliked_artists", [])}
 
-    def allowed(track: dict[str, Any]) -> bool:
-        title = str(track.get("title") or "").lower().strip()
-        artist = str(track.get("artist") or "").lower().strip()
-        if not title or not artist:
-            return False
-        if title in disliked_titles or artist in disliked_artists:
-            return False
-        return True
-
     db_tracks_flat: list[dict[str, Any]] = []
     seen: set[str] = set()
     for phase in playlist:
         tracks = phase.get("tracks", []) or []
         filtered: list[dict[str, Any]] = []
         for track in tracks:
-            if not isinstance(track, dict) or not allowed(track):
-                continue
             key = normalize_track_key(track.get("title"), track.get("artist"))
             if key in seen:
                 continue
             seen.add(key)
-            t = dict(track)
-            t["source"] = "db"
-            filtered.append(t)
+            # base is built fresh for this call, so tag its rows in place
+            track["source"] = "db"
+            filtered.append(track)
             db_tracks_flat.append(
                 {
-                    "title": t.get("title"),
-                    "artist": t.get("artist"),
-                    "bpm": t.get("bpm"),
-                    "track_type": t.get("track_type"),
+                    "title": track.get("title"),
+                    "artist": track.get("artist"),
+                    "bpm": track.get("bpm"),
+                    "track_type": track.get("track_type"),
                     "phase": phase.get("phase"),
                 }
             )
@@ -1119,19 +1969,23 @@ def build_hybrid_playlist(
     desired_count = derive_target_track_count(duration_minutes, target_tracks)
     needed_count = max(0, desired_count - len(db_tracks_flat))
 
-    ai_tracks = suggest_external_tracks_with_openai(
-        duration_minutes=duration_minutes,
-        difficulty=difficulty,
-        theme=theme,
-        audience=audience,
-        needed_count=needed_count,
-        existing_tracks=db_tracks_flat,
-        feedback_signals=feedback,
-    )
+    ai_tracks: list[dict[str, Any]] = []
+    if needed_count > 0:
+        ai_tracks = suggest_external_tracks_with_openai(
+            duration_minutes=duration_minutes,
+            difficulty=difficulty,
+            theme=theme,
+            audience=audience,
+            needed_count=needed_count,
+            existing_tracks=db_tracks_flat,
+            feedback_signals=feedback,
+        )
+    else:
+        logger.debug("DB coverage sufficient; skipping AI gap-fill.")
 
-    added_ai = 0
+    picked: list[dict[str, Any]] = []
     for item in ai_tracks:
-        if added_ai >= needed_count:
+        if len(picked) >= needed_count:
             break
         title = item.get("title")
         artist = item.get("artist")
@@ -1143,11 +1997,26 @@ def build_hybrid_playlist(
         if str(artist).lower().strip() in disliked_artists:
             continue
         seen.add(key)
+        picked.append(item)
+
+    # Suggestions the catalogue already holds take its metadata, fetched for
+    # all of them in one query
+    matches = (
+        with_conn(
+            ctx,
+            find_catalog_tracks,
+            [(item["title"], item["artist"]) for item in picked],
+        )
+        if picked
+        else []
+    )
+
+    for item, existing in zip(picked, matches):
         track = {
             "id": None,
             "spotify_id": None,
-            "title": title,
-            "artist": artist,
+            "title": item.get("title"),
+            "artist": item.get("artist"),
             "bpm": item.get("estimated_bpm"),
             "intensity": "medium",
             "track_type": item.get("focus_area"),
@@ -1164,19 +2033,23 @@ def build_hybrid_playlist(
             "notes": item.get("notes"),
             "source": "ai",
         }
+        if existing:
+            track.update(
+                (k, serialize(existing[k])) for k in _CATALOG_FIELDS if k in existing
+            )
         add_track_to_phase(
             playlist, focus_area_to_phase_name(str(item.get("focus_area") or "")), track
         )
-        added_ai += 1
+    added_ai = len(picked)
 
     tracks_flat: list[dict[str, Any]] = []
+    total_duration = 0
     for phase in playlist:
+        phase_name = phase.get("phase")
         for track in phase.get("tracks", []) or []:
-            t = dict(track)
-            t["phase"] = phase.get("phase")
-            tracks_flat.append(t)
-
-    total_duration = sum((t.get("duration_minutes") or 0) for t in tracks_flat)
+            # The flat list carries the phase name; the nested tracks don't
+            tracks_flat.append({**track, "phase": phase_name})
+            total_duration += track.get("duration_minutes") or 0
     result = {
         "target_duration": duration_minutes,
         "estimated_duration": round(total_duration, 1),
@@ -1190,10 +2063,57 @@ def build_hybrid_playlist(
         "playlist": playlist,
         "tracks": tracks_flat,
     }
-    return json.dumps(result, indent=2)
+    return to_json(result)
+
+
+@mcp.tool()
+async def build_hybrid_playlist(
+    ctx: Context,
+    duration_minutes: int = 45,
+    difficulty: str | None = None,
+    theme: str | None = None,
+    audience: str | None = None,
+    target_tracks: int | None = None,
+) -> str:
+    """Build a full playlist using DB anchors plus OpenAI gap-fill suggestions.
+
+    This tool:
+    1) Builds a base playlist from local DB tracks.
+    2) Applies feedback filters to remove disliked tracks/artists.
+    3) Uses OpenAI to suggest additional tracks only when DB coverage is short.
+    4) Returns a merged, ordered playlist.
+    """
+    # The base playlist and the feedback signals don't depend on each other,
+    # so fetch them concurrently on two pooled connections
+    base, feedback = await asyncio.gather(
+        asyncio.to_thread(
+            with_conn,
+            ctx,
+            compose_class_playlist,
+            duration_minutes,
+            difficulty,
+            theme,
+            audience,
+            feedback_summary=ctx.request_context.lifespan_context.feedback_summary,
+            exclude_disliked=True,
+        ),
+        asyncio.to_thread(with_conn, ctx, fetch_feedback_signals, audience=audience),
+    )
+    return await asyncio.to_thread(
+        merge_hybrid_playlist,
+        ctx,
+        base,
+        feedback,
+        duration_minutes,
+        difficulty,
+        theme,
+        audience,
+        target_tracks,
+    )
 
 
 @mcp.tool()
+@run_in_thread
 def recommend_class_tracks(
     ctx: Context,
     class_length_minutes: int = 55,
@@ -1220,130 +2140,124 @@ def recommend_class_tracks(
       return full DB track schema + suggest_type.
     - Otherwise return: title, artist, bpm, suggest_type.
     """
-    conn = get_conn(ctx)
-    try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-
-        preferred_genre_list = parse_csv_list(preferred_genres)
-        preferred_artist_list = parse_csv_list(preferred_artists)
-        excluded_genre_list = [g.lower() for g in parse_csv_list(exclude_genres)]
-        excluded_song_artist_list = parse_csv_list(exclude_songs_or_artists)
-        arc = normalize_arc_types(custom_intensity_arc, class_length_minutes)
+    preferred_genre_list = parse_csv_list(preferred_genres)
+    preferred_artist_list = parse_csv_list(preferred_artists)
+    excluded_genre_list = [g.lower() for g in parse_csv_list(exclude_genres)]
+    excluded_song_artist_list = parse_csv_list(exclude_songs_or_artists)
+    arc = normalize_arc_types(custom_intensity_arc, class_length_minutes)
+
+    # Feedback signals for ranking and filtering.
+    feedback = with_conn(ctx, fetch_feedback_signals, audience=audience)
+    disliked_titles = {t.lower().strip() for t in feedback.get("disliked_titles", [])}
+    disliked_artists = {a.lower().strip() for a in feedback.get("disliked_artists", [])}
 
-        # Feedback signals for ranking and filtering.
-        feedback = fetch_feedback_signals(conn, audience=audience)
-        disliked_titles = {
-            t.lower().strip() for t in feedback.get("disliked_titles", [])
-        }
-        disliked_artists = {
-            a.lower().strip() for a in feedback.get("disliked_artists", [])
-        }
+    # Track count target (about 3.5-4.5 minutes average per song).
+    target_count = max(8, min(20, round(class_length_minutes / 4)))
+
+    theme_parts = []
+    if theme:
+        theme_parts.append(f"Theme: {theme}")
+    if vibe:
+        theme_parts.append(f"Vibe: {vibe}")
+    if arc:
+        theme_parts.append(f"Class intensity arc: {', '.join(arc)}")
+    if preferred_genre_list:
+        theme_parts.append(f"Preferred genres: {', '.join(preferred_genre_list)}")
+    if preferred_artist_list:
+        theme_parts.append(f"Preferred artists: {', '.join(preferred_artist_list)}")
+    if excluded_genre_list:
+        theme_parts.append(f"Excluded genres: {', '.join(excluded_genre_list)}")
+    if excluded_song_artist_list:
+        theme_parts.append(
+            f"Excluded songs or artists: {', '.join(excluded_song_artist_list)}"
+        )
 
-        # Track count target (about 3.5-4.5 minutes average per song).
-        target_count = max(8, min(20, round(class_length_minutes / 4)))
-
-        theme_parts = []
-        if theme:
-            theme_parts.append(f"Theme: {theme}")
-        if vibe:
-            theme_parts.append(f"Vibe: {vibe}")
-        if arc:
-            theme_parts.append(f"Class intensity arc: {', '.join(arc)}")
-        if preferred_genre_list:
-            theme_parts.append(f"Preferred genres: {', '.join(preferred_genre_list)}")
-        if preferred_artist_list:
-            theme_parts.append(f"Preferred artists: {', '.join(preferred_artist_list)}")
-        if excluded_genre_list:
-            theme_parts.append(f"Excluded genres: {', '.join(excluded_genre_list)}")
-        if excluded_song_artist_list:
-            theme_parts.append(
-                f"Excluded songs or artists: {', '.join(excluded_song_artist_list)}"
-            )
+    composed_theme = " | ".join(theme_parts) if theme_parts else None
 
-        composed_theme = " | ".join(theme_parts) if theme_parts else None
+    # OpenAI-first flow: generate candidate tracks using feedback + preferences.
+    # No pooled connection is held while waiting on OpenAI.
+    ai_tracks = suggest_external_tracks_with_openai(
+        duration_minutes=class_length_minutes,
+        difficulty=None,
+        theme=composed_theme,
+        audience=audience,
+        needed_count=target_count,
+        existing_tracks=[],
+        feedback_signals=feedback,
+    )
 
-        # OpenAI-first flow: generate candidate tracks using feedback + preferences.
-        ai_tracks = suggest_external_tracks_with_openai(
-            duration_minutes=class_length_minutes,
-            difficulty=None,
-            theme=composed_theme,
-            audience=audience,
-            needed_count=target_count,
-            existing_tracks=[],
-            feedback_signals=feedback,
-        )
+    used: set[str] = set()
+    candidates: list[tuple[str, str, str, Any]] = []
+    excluded_tokens = [x.lower() for x in excluded_song_artist_list]
+    for t in ai_tracks:
+        if len(candidates) >= target_count:
+            break
 
-        used: set[str] = set()
-        results: list[dict[str, Any]] = []
-        excluded_tokens = [x.lower() for x in excluded_song_artist_list]
-        for t in ai_tracks:
-            if len(results) >= target_count:
-                break
+        title = str(t.get("title") or "").strip()
+        artist = str(t.get("artist") or "").strip()
+        if not title or not artist:
+            continue
 
-            title = str(t.get("title") or "").strip()
-            artist = str(t.get("artist") or "").strip()
-            if not title or not artist:
-                continue
+        title_lower = title.lower()
+        artist_lower = artist.lower()
+        key = normalize_track_key(title, artist)
+        if key in used:
+            continue
+        if title_lower in disliked_titles or artist_lower in disliked_artists:
+            continue
+        if any(
+            token and (token in title_lower or token in artist_lower)
+            for token in excluded_tokens
+        ):
+            continue
 
-            title_lower = title.lower()
-            artist_lower = artist.lower()
-            key = normalize_track_key(title, artist)
-            if key in used:
-                continue
-            if title_lower in disliked_titles or artist_lower in disliked_artists:
-                continue
-            if any(
-                token and (token in title_lower or token in artist_lower)
-                for token in excluded_tokens
-            ):
-                continue
+        suggest_type = str(t.get("focus_area") or "build").lower()
+        if suggest_type not in {
+            "warmup",
+            "build",
+            "climb",
+            "sprint",
+            "recovery",
+            "cooldown",
+        }:
+            suggest_type = "build"
+
+        used.add(key)
+        candidates.append((title, artist, suggest_type, t.get("estimated_bpm")))
+
+    # Look up every suggestion in the catalogue in one query
+    matches = (
+        with_conn(ctx, find_catalog_tracks, [(c[0], c[1]) for c in candidates])
+        if candidates
+        else []
+    )
 
-            suggest_type = str(t.get("focus_area") or "build").lower()
-            if suggest_type not in {
-                "warmup",
-                "build",
-                "climb",
-                "sprint",
-                "recovery",
-                "cooldown",
-            }:
-                suggest_type = "build"
-
-            cur.execute(
-                """
-                SELECT *
-                FROM tracks
-                WHERE LOWER(TRIM(title)) = LOWER(TRIM(%s))
-                  AND LOWER(TRIM(artist)) = LOWER(TRIM(%s))
-                LIMIT 1
-                """,
-                (title, artist),
+    results: list[dict[str, Any]] = []
+    for (title, artist, suggest_type, estimated_bpm), existing in zip(
+        candidates, matches
+    ):
+        if existing:
+            # If the AI suggestion exists in DB, return full DB track schema.
+            full_track = {k: serialize(v) for k, v in existing.items()}
+            full_track["suggest_type"] = suggest_type
+            results.append(full_track)
+        else:
+            # If not in DB, return minimal shape only.
+            results.append(
+                {
+                    "title": title,
+                    "artist": artist,
+                    "bpm": estimated_bpm,
+                    "suggest_type": suggest_type,
+                }
             )
-            existing = cur.fetchone()
-
-            used.add(key)
-            if existing:
-                # If the AI suggestion exists in DB, return full DB track schema.
-                full_track = {k: serialize(v) for k, v in dict(existing).items()}
-                full_track["suggest_type"] = suggest_type
-                results.append(full_track)
-            else:
-                # If not in DB, return minimal shape only.
-                results.append(
-                    {
-                        "title": title,
-                        "artist": artist,
-                        "bpm": t.get("estimated_bpm"),
-                        "suggest_type": suggest_type,
-                    }
-                )
 
-        return json.dumps({"tracks": results}, indent=2)
-    finally:
-        put_conn(ctx, conn)
+    return to_json({"tracks": results})
 
 
 @mcp.tool()
+@cached_tool
+@run_in_thread
 def list_routines(
     ctx: Context,
     difficulty: str | None = None,
@@ -1359,7 +2273,7 @@ def list_routines(
     """
     conn = get_conn(ctx)
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur = conn.cursor()
         conditions = []
         params = []
 
@@ -1370,33 +2284,76 @@ def list_routines(
         where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         params.append(min(limit, 50))
 
-        cur.execute(
+        # Postgres builds the compact JSON array itself; tags stay as stored
+        # jsonb instead of round-tripping through Python objects
+        execute_prepared(
+            cur,
             f"""
-            SELECT r.name, r.description, r.theme, r.intensity_arc,
-                   r.difficulty, r.total_duration_minutes,
-                   r.class_summary, r.tags,
-                   r.spotify_playlist_id,
-                   COUNT(rt.id) as track_count
-            FROM routines r
-            LEFT JOIN routine_tracks rt ON r.id = rt.routine_id
-            {where}
-            GROUP BY r.id, r.name, r.description, r.theme, r.intensity_arc,
-                     r.difficulty, r.total_duration_minutes, r.class_summary,
-                     r.tags, r.spotify_playlist_id
-            ORDER BY r.name
-            LIMIT %s
+            SELECT COALESCE(
+                '[' || string_agg(row_to_json(routine)::text, ',' ORDER BY name)
+                    || ']',
+                '[]'
+            )
+            FROM (
+                SELECT r.name, r.description, r.theme, r.intensity_arc,
+                       r.difficulty,
+                       r.total_duration_minutes::float8 as total_duration_minutes,
+                       r.class_summary, r.tags,
+                       r.spotify_playlist_id,
+                       COUNT(rt.id) as track_count
+                FROM routines r
+                LEFT JOIN routine_tracks rt ON r.id = rt.routine_id
+                {where}
+                GROUP BY r.id, r.name, r.description, r.theme, r.intensity_arc,
+                         r.difficulty, r.total_duration_minutes, r.class_summary,
+                         r.tags, r.spotify_playlist_id
+                ORDER BY r.name
+                LIMIT %s
+            ) routine
         """,
             params,
         )
 
-        rows = serialize_rows(cur.fetchall())
+        row = cur.fetchone()
         cur.close()
-        return json.dumps(rows, indent=2)
+        body = row[0] if row else "[]"
+        if SETTINGS.pretty_json:
+            return to_json(json.loads(body))
+        return body
     finally:
         put_conn(ctx, conn)
 
 
+# base44 feedback syncs run off the request path on a shared keep-alive session
+_BASE44_SESSION = requests.Session()
+_BASE44_SESSION.headers.update({"Content-Type": "application/json"})
+# Connection failures are retried; a POST that reached base44 is never resent
+_BASE44_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=2,
+        max_retries=Retry(total=2, backoff_factor=0.2),
+    ),
+)
+
+
+def sync_feedback_to_base44(url: str, api_key: str, payload: dict[str, Any]) -> None:
+    """POST one feedback record to base44, logging instead of raising on failure."""
+    try:
+        response = _BASE44_SESSION.post(
+            url,
+            headers={"api_key": api_key},
+            json=payload,
+            timeout=10,
+        )
+        response.raise_for_status()
+    except Exception as e:
+        logger.error(f"Failed to sync feedback to base44: {e}")
+
+
 @mcp.tool()
+@run_in_thread
 def rate_track(
     ctx: Context,
     track_title: str,
@@ -1416,75 +2373,77 @@ def rate_track(
         audience: Target audience demographic (e.g. '50+', 'mixed', 'young')
     """
     if rating not in ("up", "down"):
-        return json.dumps({"error": "Rating must be 'up' or 'down'"})
+        return to_json({"error": "Rating must be 'up' or 'down'"})
+    if not ctx.request_context.lifespan_context.feedback_upsert:
+        return to_json({"error": _FEEDBACK_UPSERT_MISSING})
 
     conn = get_conn(ctx)
     try:
         cur = conn.cursor(cursor_factory=RealDictCursor)
 
         # Look up the track to get artist and spotify_id
-        cur.execute(
+        execute_prepared(
+            cur,
             "SELECT title, artist, spotify_id FROM tracks WHERE title ILIKE %s LIMIT 1",
-            (f"%{track_title}%",),
+            [f"%{track_title}%"],
         )
         track = cur.fetchone()
 
         if not track:
             cur.close()
-            return json.dumps({"error": f"Track '{track_title}' not found in database"})
+            return to_json({"error": f"Track '{track_title}' not found in database"})
 
         track_title_exact = track["title"]
         track_artist = track["artist"]
         spotify_id = track["spotify_id"]
 
         # Insert into local database
-        cur.execute(
-            """
+        execute_prepared(
+            cur,
+            f"""
             INSERT INTO track_feedback (
                 track_title, track_artist, spotify_id,
                 rating, context, audience, updated_at
             )
             VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-            ON CONFLICT (track_title, rating, COALESCE(context, ''), COALESCE(audience, ''))
+            ON CONFLICT ({_FEEDBACK_CONFLICT_KEY})
             DO UPDATE SET updated_at = CURRENT_TIMESTAMP
             RETURNING id
         """,
-            (track_title_exact, track_artist, spotify_id, rating, context, audience),
+            [track_title_exact, track_artist, spotify_id, rating, context, audience],
         )
 
         feedback_id = cur.fetchone()["id"]
         conn.commit()
 
-        # Sync to base44
+        # Tools reading track_feedback directly see the rating now; the
+        # refresher clears the cache again once the summary view catches up
+        _TOOL_CACHE.clear()
         app_ctx = ctx.request_context.lifespan_context
+        if app_ctx.summary_refresher:
+            app_ctx.summary_refresher.request()
+
+        # Sync to base44 in the background; the local save is what the caller
+        # waits for
         base44_result = None
         if app_ctx.base44_api_key and app_ctx.base44_app_id:
-            try:
-                response = requests.post(
-                    f"{app_ctx.base44_api_url}/apps/{app_ctx.base44_app_id}/entities/TrackFeedback",
-                    headers={
-                        "api_key": app_ctx.base44_api_key,
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "track_title": track_title_exact,
-                        "track_artist": track_artist,
-                        "spotify_id": spotify_id,
-                        "rating": rating,
-                        "context": context or "",
-                    },
-                    timeout=10,
-                )
-                response.raise_for_status()
-                base44_result = "synced"
-            except Exception as e:
-                logger.error(f"Failed to sync feedback to base44: {e}")
-                base44_result = f"failed: {e}"
+            queued = app_ctx.base44_sync.submit(
+                f"{app_ctx.base44_api_url}/apps/{app_ctx.base44_app_id}/entities/TrackFeedback",
+                app_ctx.base44_api_key,
+                {
+                    "track_title": track_title_exact,
+                    "track_artist": track_artist,
+                    "spotify_id": spotify_id,
+                    "rating": rating,
+                    "context": context or "",
+                },
+            )
+            base44_result = "queued" if queued else "dropped (sync backlog full)"
 
         cur.close()
 
         emoji = "\U0001f44d" if rating == "up" else "\U0001f44e"
-        return json.dumps(
+        return to_json(
             {
                 "status": "saved",
                 "feedback_id": feedback_id,
@@ -1495,75 +2454,245 @@ def rate_track(
                 "audience": audience,
                 "base44_sync": base44_result or "skipped (no API credentials)",
             },
-            indent=2,
         )
     except Exception as e:
         conn.rollback()
-        return json.dumps({"error": f"Failed to save rating: {e}"})
+        return to_json({"error": f"Failed to save rating: {e}"})
     finally:
         put_conn(ctx, conn)
 
 
-# ---------------------------------------------------------------------------
-# Resources
-# ---------------------------------------------------------------------------
+@mcp.tool()
+@run_in_thread
+def rate_tracks_batch(ctx: Context, ratings: str) -> str:
+    """Rate several tracks at once. Saves to local database AND syncs to base44.
 
+    Use this instead of repeated rate_track calls when grading a whole
+    playlist: every rating is looked up and saved in a single transaction.
 
-@mcp.resource("stats://tracks")
-def track_stats() -> str:
-    """Summary statistics of available tracks by type, intensity, and BPM ranges."""
-    load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
-    conn = psycopg2.connect(
-        host=os.getenv("DB_HOST", "localhost"),
-        port=int(os.getenv("DB_PORT", "5432")),
-        database=os.getenv("DB_NAME", "choreography"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-    )
+    Args:
+        ratings: JSON list of objects with keys track_title, rating ('up' or
+                 'down'), and optional context and audience
+    """
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+        items = json.loads(ratings)
+    except json.JSONDecodeError as e:
+        return to_json({"error": f"ratings must be a JSON list: {e}"})
+    if not isinstance(items, list) or not all(isinstance(i, dict) for i in items):
+        return to_json({"error": "ratings must be a JSON list of objects"})
+    if not items:
+        return to_json({"error": "No ratings given"})
+    for item in items:
+        if not item.get("track_title"):
+            return to_json({"error": "Every rating needs a track_title"})
+        if item.get("rating") not in ("up", "down"):
+            return to_json({"error": "Rating must be 'up' or 'down'"})
+    if not ctx.request_context.lifespan_context.feedback_upsert:
+        return to_json({"error": _FEEDBACK_UPSERT_MISSING})
 
-        cur.execute("SELECT COUNT(*) as total FROM tracks")
-        total = cur.fetchone()["total"]
+    conn = get_conn(ctx)
+    try:
+        cur = conn.cursor()
 
-        cur.execute("""
-            SELECT track_type, COUNT(*) as count,
-                   ROUND(AVG(bpm)::numeric, 1) as avg_bpm,
-                   ROUND(MIN(bpm)::numeric, 1) as min_bpm,
-                   ROUND(MAX(bpm)::numeric, 1) as max_bpm
-            FROM tracks
-            WHERE track_type IS NOT NULL
-            GROUP BY track_type ORDER BY count DESC
-        """)
-        by_type = serialize_rows(cur.fetchall())
-
-        cur.execute("""
-            SELECT intensity, COUNT(*) as count
-            FROM tracks WHERE intensity IS NOT NULL
-            GROUP BY intensity ORDER BY count DESC
-        """)
-        by_intensity = serialize_rows(cur.fetchall())
-
-        cur.execute("""
-            SELECT ROUND(MIN(bpm)::numeric, 1) as min_bpm,
-                   ROUND(MAX(bpm)::numeric, 1) as max_bpm,
-                   ROUND(AVG(bpm)::numeric, 1) as avg_bpm
-            FROM tracks WHERE bpm IS NOT NULL
-        """)
-        bpm_range = serialize_rows(cur.fetchall())[0]
+        # Same partial-title match as rate_track, for every rating at once
+        execute_prepared(
+            cur,
+            """
+            SELECT x.idx, t.title, t.artist, t.spotify_id
+            FROM unnest(%s::text[]) WITH ORDINALITY as x(pattern, idx)
+            CROSS JOIN LATERAL (
+                SELECT title, artist, spotify_id FROM tracks
+                WHERE title ILIKE x.pattern
+                LIMIT 1
+            ) t
+            """,
+            [[f"%{item['track_title']}%" for item in items]],
+        )
+        found = {
+            idx: (title, artist, spotify_id)
+            for idx, title, artist, spotify_id in cur.fetchall()
+        }
 
+        # One row per conflict key; ON CONFLICT cannot touch a row twice
+        rows: dict[tuple[str, str, str, str], tuple[Any, ...]] = {}
+        results = []
+        for idx, item in enumerate(items, start=1):
+            if idx not in found:
+                results.append(
+                    {
+                        "track": item["track_title"],
+                        "error": "not found in database",
+                    }
+                )
+                continue
+            title, artist, spotify_id = found[idx]
+            context = item.get("context")
+            audience = item.get("audience")
+            rows[(title, item["rating"], context or "", audience or "")] = (
+                title,
+                artist,
+                spotify_id,
+                item["rating"],
+                context,
+                audience,
+            )
+
+        saved = []
+        if rows:
+            saved = execute_values(
+                cur,
+                f"""
+                INSERT INTO track_feedback (
+                    track_title, track_artist, spotify_id,
+                    rating, context, audience, updated_at
+                )
+                VALUES %s
+                ON CONFLICT ({_FEEDBACK_CONFLICT_KEY})
+                DO UPDATE SET updated_at = CURRENT_TIMESTAMP
+                RETURNING id, track_title, track_artist, rating, context, audience
+                """,
+                list(rows.values()),
+                template="(%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)",
+                fetch=True,
+            )
+        conn.commit()
         cur.close()
-        return json.dumps(
+
+        # As in rate_track: clear now for direct track_feedback readers, and
+        # again from the refresher once the summary view includes the batch
+        _TOOL_CACHE.clear()
+        app_ctx = ctx.request_context.lifespan_context
+        if saved and app_ctx.summary_refresher:
+            app_ctx.summary_refresher.request()
+
+        base44_result = "skipped (no API credentials)"
+        if app_ctx.base44_api_key and app_ctx.base44_app_id:
+            url = f"{app_ctx.base44_api_url}/apps/{app_ctx.base44_app_id}/entities/TrackFeedback"
+            dropped = 0
+            for title, artist, spotify_id, rating, context, _ in rows.values():
+                queued = app_ctx.base44_sync.submit(
+                    url,
+                    app_ctx.base44_api_key,
+                    {
+                        "track_title": title,
+                        "track_artist": artist,
+                        "spotify_id": spotify_id,
+                        "rating": rating,
+                        "context": context or "",
+                    },
+                )
+                dropped += not queued
+            base44_result = (
+                f"queued ({dropped} dropped, sync backlog full)"
+                if dropped
+                else "queued"
+            )
+
+        for feedback_id, title, artist, rating, context, audience in saved:
+            emoji = "\U0001f44d" if rating == "up" else "\U0001f44e"
+            results.append(
+                {
+                    "status": "saved",
+                    "feedback_id": feedback_id,
+                    "track": title,
+                    "artist": artist,
+                    "rating": f"{emoji} {rating}",
+                    "context": context,
+                    "audience": audience,
+                }
+            )
+
+        return to_json(
             {
-                "total_tracks": total,
-                "by_track_type": by_type,
-                "by_intensity": by_intensity,
-                "bpm_range": bpm_range,
+                "saved": len(saved),
+                "failed": len(results) - len(saved),
+                "base44_sync": base44_result,
+                "results": results,
             },
-            indent=2,
         )
+    except Exception as e:
+        conn.rollback()
+        return to_json({"error": f"Failed to save ratings: {e}"})
     finally:
-        conn.close()
+        put_conn(ctx, conn)
+
+
+# ---------------------------------------------------------------------------
+# Resources
+# ---------------------------------------------------------------------------
+
+
+@mcp.resource("stats://tracks")
+@cached_tool
+@run_in_thread
+def track_stats() -> str:
+    """Summary statistics of available tracks by type, intensity, and BPM ranges."""
+    # A Context parameter would turn this resource into a URI template, so
+    # reach the lifespan pool through the current request instead
+    ctx = mcp.get_context()
+    conn = get_conn(ctx)
+    try:
+        cur = conn.cursor()
+
+        # One scan for everything: the grand total row carries the overall
+        # count and BPM range, the other grouping sets the per-type and
+        # per-intensity breakdowns. bpm is numeric, so the average is summed
+        # in float8 and only the per-group results are rounded. Postgres
+        # assembles the compact JSON document itself, as list_routines does.
+        execute_prepared(
+            cur,
+            """
+            WITH stats AS MATERIALIZED (
+                SELECT GROUPING(track_type) as all_types,
+                       GROUPING(intensity) as all_intensities,
+                       track_type, intensity, COUNT(*) as count,
+                       ROUND(AVG(bpm::float8)::numeric, 1) as avg_bpm,
+                       ROUND(MIN(bpm), 1) as min_bpm,
+                       ROUND(MAX(bpm), 1) as max_bpm
+                FROM tracks
+                GROUP BY GROUPING SETS ((), (track_type), (intensity))
+            )
+            SELECT '{"total_tracks":'
+                || COALESCE(
+                    (SELECT count FROM stats
+                     WHERE all_types = 1 AND all_intensities = 1), 0)
+                || ',"by_track_type":['
+                || COALESCE(
+                    (SELECT string_agg(
+                                row_to_json(t)::text, ','
+                                ORDER BY t.count DESC, t.track_type)
+                     FROM (SELECT track_type, count, avg_bpm, min_bpm, max_bpm
+                           FROM stats
+                           WHERE all_types = 0 AND track_type IS NOT NULL) t),
+                    '')
+                || '],"by_intensity":['
+                || COALESCE(
+                    (SELECT string_agg(
+                                row_to_json(i)::text, ','
+                                ORDER BY i.count DESC, i.intensity)
+                     FROM (SELECT intensity, count
+                           FROM stats
+                           WHERE all_intensities = 0 AND all_types = 1
+                             AND intensity IS NOT NULL) i),
+                    '')
+                || '],"bpm_range":'
+                || COALESCE(
+                    (SELECT row_to_json(b)::text
+                     FROM (SELECT min_bpm, max_bpm, avg_bpm
+                           FROM stats
+                           WHERE all_types = 1 AND all_intensities = 1) b),
+                    '{}')
+                || '}'
+        """,
+            [],
+        )
+        body = cur.fetchone()[0]
+        cur.close()
+        if SETTINGS.pretty_json:
+            return to_json(json.loads(body))
+        return body
+    finally:
+        put_conn(ctx, conn)
 
 
 # ---------------------------------------------------------------------------
@@ -1619,38 +2748,38 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run choreography MCP server.")
     parser.add_argument(
         "--transport",
-        default=os.getenv("MCP_TRANSPORT", "stdio"),
+        default=SETTINGS.mcp_transport,
         help="MCP transport (default: stdio).",
     )
     parser.add_argument(
         "--host",
-        default=os.getenv("MCP_HOST", "127.0.0.1"),
+        default=SETTINGS.mcp_host,
         help="Host for SSE/HTTP transports (default: 127.0.0.1).",
     )
     parser.add_argument(
         "--port",
         type=int,
-        default=int(os.getenv("MCP_PORT", "8000")),
+        default=SETTINGS.mcp_port,
         help="Port for SSE/HTTP transports (default: 8000).",
     )
     parser.add_argument(
         "--mount-path",
-        default=os.getenv("MCP_MOUNT_PATH", "/"),
+        default=SETTINGS.mcp_mount_path,
         help="Mount path for SSE transport app (default: /).",
     )
     parser.add_argument(
         "--sse-path",
-        default=os.getenv("MCP_SSE_PATH", "/sse"),
+        default=SETTINGS.mcp_sse_path,
         help="SSE endpoint path (default: /sse).",
     )
     parser.add_argument(
         "--message-path",
-        default=os.getenv("MCP_MESSAGE_PATH", "/messages/"),
+        default=SETTINGS.mcp_message_path,
         help="SSE message endpoint path (default: /messages/).",
     )
     parser.add_argument(
         "--http-path",
-        default=os.getenv("MCP_HTTP_PATH", "/mcp"),
+        default=SETTINGS.mcp_http_path,
         help="Streamable HTTP endpoint path (default: /mcp).",
     )
     args = parser.parse_args()
@@ -0,0 +1,36 @@
+-- Migration to precompute per-track feedback counts for the MCP server
+-- Refreshed by rate_track and by sync_trackfeedback.py after they write feedback
+-- Safe to re-run: the view only holds derived data, so it is rebuilt each time
+
+DROP MATERIALIZED VIEW IF EXISTS track_feedback_summary;
+
+-- up/down counts overall, plus per-audience counts keyed by audience
+CREATE MATERIALIZED VIEW track_feedback_summary AS
+WITH per_audience AS (
+    SELECT track_title,
+           audience,
+           SUM(CASE WHEN rating = 'up' THEN 1 ELSE 0 END) AS up_count,
+           SUM(CASE WHEN rating = 'down' THEN 1 ELSE 0 END) AS down_count
+    FROM track_feedback
+    WHERE track_title IS NOT NULL
+    GROUP BY track_title, audience
+)
+SELECT track_title,
+       SUM(up_count)::BIGINT AS up_count,
+       SUM(down_count)::BIGINT AS down_count,
+       COALESCE(
+           jsonb_object_agg(audience, up_count) FILTER (WHERE audience IS NOT NULL),
+           '{}'
+       ) AS up_by_audience,
+       COALESCE(
+           jsonb_object_agg(audience, down_count) FILTER (WHERE audience IS NOT NULL),
+           '{}'
+       ) AS down_by_audience
+FROM per_audience
+GROUP BY track_title;
+
+-- Required for REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_track_feedback_summary_title
+ON track_feedback_summary(track_title);
+
+ANALYZE track_feedback_summary;
@@ -0,0 +1,36 @@
+-- Migration to add a single searchable text column for search_tracks keywords
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Columns created before the \x1f separator was added let a keyword match
+-- across the end of one column and the start of the next; rebuild them
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1
+        FROM pg_attrdef d
+        JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum
+        WHERE d.adrelid = to_regclass('tracks')
+          AND a.attname = 'search_blob'
+          AND position(chr(31) in pg_get_expr(d.adbin, d.adrelid)) = 0
+    ) THEN
+        ALTER TABLE tracks DROP COLUMN search_blob;
+    END IF;
+END
+$$;
+
+-- title/artist/album/notes in one value, so a keyword is one ILIKE per row.
+-- The \x1f separator can't appear in a keyword sent down this path, so a
+-- match never spans two columns.
+ALTER TABLE tracks ADD COLUMN IF NOT EXISTS search_blob TEXT
+GENERATED ALWAYS AS (
+    COALESCE(title, '') || E'\x1f' ||
+    COALESCE(artist, '') || E'\x1f' ||
+    COALESCE(album, '') || E'\x1f' ||
+    COALESCE(notes, '')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_tracks_search_blob_trgm
+ON tracks USING GIN(search_blob gin_trgm_ops);
+
+ANALYZE tracks;
@@ -0,0 +1,51 @@
+-- Migration to add indexes matched to the MCP tool queries
+
+-- Trigram indexes so ILIKE '%term%' filters can use an index scan
+-- (pg_trgm is a trusted extension, so the database owner can create it)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_tracks_title_trgm ON tracks USING GIN(title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tracks_artist_trgm ON tracks USING GIN(artist gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tracks_album_trgm ON tracks USING GIN(album gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tracks_notes_trgm ON tracks USING GIN(notes gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tracks_track_type_trgm ON tracks USING GIN(track_type gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tracks_position_trgm ON tracks USING GIN(position gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tracks_focus_area_trgm ON tracks USING GIN(focus_area gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_track_feedback_context_trgm
+ON track_feedback USING GIN(context gin_trgm_ops);
+
+-- Intensity equality combined with a BPM range (search_tracks, suggest_tracks_for_slot)
+CREATE INDEX IF NOT EXISTS idx_tracks_intensity_bpm ON tracks(intensity, bpm);
+
+-- Duration ranges (suggest_tracks_for_slot duration_min/duration_max);
+-- bpm and intensity already have btree indexes from schema.sql
+CREATE INDEX IF NOT EXISTS idx_tracks_duration_minutes ON tracks(duration_minutes);
+
+-- Case-insensitive track type with intensity (build_class_playlist phases)
+CREATE INDEX IF NOT EXISTS idx_tracks_type_lower_intensity
+ON tracks(LOWER(track_type), intensity);
+
+-- Covering index for the stats://tracks grouping sets: an index-only scan
+-- reads the grouped columns and bpm without touching the wide heap rows
+CREATE INDEX IF NOT EXISTS idx_tracks_type_intensity_bpm
+ON tracks(track_type, intensity) INCLUDE (bpm);
+
+-- Per-title feedback aggregation joined into the track suggestions
+CREATE INDEX IF NOT EXISTS idx_track_feedback_title_rating
+ON track_feedback(track_title, rating) INCLUDE (audience);
+
+-- Latest feedback write, checked before serving a cached build_class_playlist
+CREATE INDEX IF NOT EXISTS idx_track_feedback_updated_at
+ON track_feedback(updated_at);
+
+-- Audience-filtered top-rated lookups (get_top_rated_tracks); most feedback
+-- has no audience, so those rows are left out of the index
+CREATE INDEX IF NOT EXISTS idx_track_feedback_audience_rating
+ON track_feedback(audience, rating) WHERE audience IS NOT NULL;
+
+-- Case- and whitespace-insensitive title/artist matching (recommend_class_tracks)
+CREATE INDEX IF NOT EXISTS idx_tracks_title_artist_norm
+ON tracks(LOWER(TRIM(title)), LOWER(TRIM(artist)));
+
+ANALYZE tracks;
+ANALYZE track_feedback;
@@ -13,44 +13,62 @@ from dotenv import load_dotenv
 
 
 def run_check(repo_root: Path, check_cmd: str, log_file: Path) -> int:
-    result = subprocess.run(
-        check_cmd,
-        cwd=repo_root,
-        shell=True,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-    )
-    output = result.stdout or ""
     log_file.parent.mkdir(parents=True, exist_ok=True)
-    log_file.write_text(output, encoding="utf-8")
-    print(output, end="")
-    return result.returncode
+    with (
+        log_file.open("w", encoding="utf-8") as log,
+        subprocess.Popen(
+            check_cmd,
+            cwd=repo_root,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+        ) as proc,
+    ):
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            log.write(line)
+            sys.stdout.write(line)
+            sys.stdout.flush()
+    return proc.returncode
+
+
+# ruff's "--> path" context lines, "path:line:col:" diagnostics, and
+# pyright's "path:line:col - error:" lines, matched in one pass over the log
+_ERROR_LOCATION = re.compile(
+    r"^\s*(?:-->\s*(?P<arrow>[^:]+\.py):\d+:\d+"
+    r"|(?P<colon>[^:\s]+\.py):\d+:\d+:"
+    r"|(?P<pyright>[^:\s]+\.py):\d+:\d+\s+-\s+error:)",
+    re.MULTILINE,
+)
+_PATTERN_RANK = {"arrow": 0, "colon": 1, "pyright": 2}
 
 
 def parse_error_files(log_text: str, repo_root: Path) -> list[Path]:
     counts: Counter[Path] = Counter()
-    patterns = [
-        re.compile(r"^\s*-->\s*([^:]+\.py):\d+:\d+", re.MULTILINE),
-        re.compile(r"^\s*([^:\s]+\.py):\d+:\d+:", re.MULTILINE),
-        re.compile(r"^\s*([^:\s]+\.py):\d+:\d+\s+-\s+error:", re.MULTILINE),
+    first_seen: dict[Path, tuple[int, int]] = {}
+
+    for match in _ERROR_LOCATION.finditer(log_text):
+        group = match.lastgroup or ""
+        path = Path(match.group(group).strip())
+        if path.is_absolute():
+            try:
+                path = path.relative_to(repo_root)
+            except ValueError:
+                continue
+        counts[path] += 1
+        seen = (_PATTERN_RANK[group], match.start())
+        first_seen[path] = min(first_seen.get(path, seen), seen)
+
+    # Ties break by the first pattern, then log position, that named the
+    # file, as when each pattern was scanned separately. Existence is
+    # checked once per distinct file, however many errors point at it.
+    ranked = sorted(counts, key=lambda path: (-counts[path], first_seen[path]))
+    return [
+        path for path in ranked if path.suffix == ".py" and (repo_root / path).exists()
     ]
 
-    for pattern in patterns:
-        for match in pattern.finditer(log_text):
-            raw = match.group(1).strip()
-            path = Path(raw)
-            if path.is_absolute():
-                try:
-                    path = path.relative_to(repo_root)
-                except ValueError:
-                    continue
-            full = repo_root / path
-            if full.exists() and full.suffix == ".py":
-                counts[path] += 1
-
-    return [p for p, _ in counts.most_common()]
-
 
 def build_prompt(
     files: list[Path],
@@ -7,6 +7,7 @@ Tracks are synced first so routine-track associations can be properly linked.
 import sys
 from datetime import datetime
 
+from config import Config
 from sync import Base44Sync
 from sync_routines import Base44RoutineSync
 from sync_trackfeedback import Base44TrackFeedbackSync
@@ -14,6 +15,7 @@ from sync_trackfeedback import Base44TrackFeedbackSync
 
 def main():
     print("=== Cycle MCP Server Complete Sync ===\n")
+    Config.validate()
     overall_start = datetime.now()
     results = {}
 
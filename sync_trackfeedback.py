@@ -148,6 +148,24 @@ class Base44TrackFeedbackSync:
 
             self.conn.commit()
 
+            # Keep the MCP server's precomputed feedback counts current. The
+            # feedback is already committed, so a failed refresh doesn't fail
+            # the sync; the next refresh catches the view up.
+            try:
+                cursor.execute(
+                    "SELECT to_regclass('track_feedback_summary') IS NOT NULL"
+                )
+                row = cursor.fetchone()
+                if row and row[0]:
+                    cursor.execute(
+                        "REFRESH MATERIALIZED VIEW CONCURRENTLY track_feedback_summary"
+                    )
+                    self.conn.commit()
+                    print("✓ Refreshed track_feedback_summary")
+            except Exception as e:
+                self.conn.rollback()
+                print(f"⚠ Failed to refresh track_feedback_summary: {e}")
+
             sync_end = datetime.now()
             print("\n✓ Track feedback sync completed successfully!")
             print(f"  - Feedback added: {added}")
@@ -27,6 +27,9 @@ from pydantic import BaseModel, Field
 
 load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
 
+# Shared across requests so OpenAI and Spotify calls reuse keep-alive connections
+_HTTP_SESSION = requests.Session()
+
 
 class PlaylistRequest(BaseModel):
     duration_minutes: int = Field(default=45, ge=20, le=120)
@@ -311,7 +314,7 @@ Ensure variety, keep pacing aligned with intensity arc, and match the vibe/theme
         "feedback_signals": feedback.model_dump(),
     }
 
-    response = requests.post(
+    response = _HTTP_SESSION.post(
         "https://api.openai.com/v1/chat/completions",
         headers={
             "Authorization": f"Bearer {api_key}",
@@ -492,7 +495,7 @@ def parse_feedback_signals(up_rows: Any, down_rows: Any) -> FeedbackSignals:
 def spotify_search_first_track(
     access_token: str, title: str, artist: str
 ) -> dict[str, Any] | None:
-    resp = requests.get(
+    resp = _HTTP_SESSION.get(
         "https://api.spotify.com/v1/search",
         params={"q": f"{title} {artist}", "type": "track", "limit": 1},
         headers={"Authorization": f"Bearer {access_token}"},